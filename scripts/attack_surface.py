@@ -8,9 +8,11 @@ import argparse
 import json
 import os
 import re
+from bisect import bisect_right
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
 
 IGNORE_DIRS = {
     ".git",
@@ -27,165 +29,221 @@ IGNORE_DIRS = {
     "knowledges",
 }
 
-EXTERNAL_CALL_PATTERNS = [
-    (re.compile(r"\.call\b"), "call"),
-    (re.compile(r"\.delegatecall\b"), "delegatecall"),
-    (re.compile(r"\.staticcall\b"), "staticcall"),
-    (re.compile(r"\.transfer\s*\("), "transfer"),
-    (re.compile(r"\.send\s*\("), "send"),
-]
+# One alternation for every call kind; the matching group name is the label.
+# When a line has several calls, the group that comes first here wins. The
+# scan runs over the whole text, so gaps are [ \t]* to stay within a line.
+EXTERNAL_CALL_RE = re.compile(
+    r"\.(?:(?P<call>call)\b"
+    r"|(?P<delegatecall>delegatecall)\b"
+    r"|(?P<staticcall>staticcall)\b"
+    r"|(?P<transfer>transfer)[ \t]*\("
+    r"|(?P<send>send)[ \t]*\()"
+)
+
+_COMMENT_OR_STRING_RE = re.compile(
+    r'"(?:\\.|[^"\\\n])*"'
+    r"|'(?:\\.|[^'\\\n])*'"
+    r"|//[^\n]*"
+    r"|/\*.*?(?:\*/|\Z)",
+    re.DOTALL,
+)
+
+_FUNC_RE = re.compile(r"\bfunction\s+(\w+)\s*\(([^)]*)\)\s*([^;{]*)")
+_FALLBACK_RE = re.compile(r"\b(fallback|receive)\s*\(([^)]*)\)\s*([^;{]*)")
+_CONTRACT_RE = re.compile(r"\b(contract|library|interface)\s+(\w+)")
 
 VISIBILITY_KEYWORDS = ["external", "public", "internal", "private"]
 ATTRIBUTE_KEYWORDS = ["view", "pure", "payable", "virtual", "override"]
 
 
-def strip_comments_keep_lines(lines: List[str]) -> List[str]:
-    """Remove // and /* */ comments while preserving line count."""
-    out: List[str] = []
-    in_block = False
+def _blank_comment(match: "re.Match[str]") -> str:
+    token = match.group(0)
+    if token[0] in "\"'":
+        return token
+    if token.startswith("//"):
+        return ""
+    newlines = token.count("\n")
+    return "\n" * newlines if newlines else " "
 
-    for line in lines:
-        working = line
 
-        if in_block:
-            if "*/" in working:
-                _, after = working.split("*/", 1)
-                working = after
-                in_block = False
-            else:
-                out.append("")
-                continue
-
-        while "/*" in working:
-            before, rest = working.split("/*", 1)
-            if "*/" in rest:
-                after = rest.split("*/", 1)[1]
-                working = before + " " + after
-            else:
-                working = before
-                in_block = True
-                break
-
-        if "//" in working:
-            working = working.split("//", 1)[0]
+def strip_comments_keep_lines(text: str) -> str:
+    """Remove // and /* */ comments while preserving line count.
 
-        out.append(working)
-
-    return out
+    A single left-to-right scan: string literals are matched as whole tokens
+    so comment markers inside them are left alone.
+    """
+    if "//" not in text and "/*" not in text:
+        return text
+    return _COMMENT_OR_STRING_RE.sub(_blank_comment, text)
 
 
 def collect_sol_files(root_dir: str) -> List[Path]:
     files: List[Path] = []
-    for base, dirs, filenames in os.walk(root_dir):
-        dirs[:] = [d for d in dirs if d not in IGNORE_DIRS]
-        for name in filenames:
-            if name.endswith(".sol"):
-                files.append(Path(base) / name)
+    stack = [root_dir]
+    while stack:
+        try:
+            entries = os.scandir(stack.pop())
+        except OSError:
+            continue
+        with entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    if entry.name not in IGNORE_DIRS:
+                        stack.append(entry.path)
+                elif entry.name.endswith(".sol"):
+                    files.append(Path(entry.path))
     return files
 
 
-def compute_contract_ranges(lines: List[str]) -> List[Dict[str, int]]:
-    ranges: List[Dict[str, int]] = []
-    stack: List[Dict[str, int]] = []
-    brace_depth = 0
+class ContractRanges(NamedTuple):
+    """Closed contract spans as parallel lists, sorted by start line."""
+    names: List[str]
+    start_lines: List[int]
+    end_lines: List[int]
 
-    contract_re = re.compile(r"\b(contract|library|interface)\s+(\w+)")
+
+def compute_contract_ranges(lines: List[str]) -> ContractRanges:
+    closed: List[Tuple[int, int, str]] = []
+    stack: List[Tuple[str, int, int]] = []
+    brace_depth = 0
 
     for idx, line in enumerate(lines, start=1):
-        match = contract_re.search(line)
-        if match:
-            stack.append({
-                "name": match.group(2),
-                "start_line": idx,
-                "start_depth": brace_depth,
-            })
+        if "contract" in line or "library" in line or "interface" in line:
+            match = _CONTRACT_RE.search(line)
+            if match:
+                stack.append((match.group(2), idx, brace_depth))
 
+        if "{" not in line and "}" not in line:
+            continue
         brace_depth += line.count("{") - line.count("}")
 
-        while stack and brace_depth <= stack[-1]["start_depth"]:
-            contract = stack.pop()
-            contract["end_line"] = idx
-            ranges.append(contract)
-
-    return ranges
-
-
-def find_contract_for_line(ranges: List[Dict[str, int]], line_no: int) -> str:
-    chosen = None
-    for item in ranges:
-        if item["start_line"] <= line_no <= item.get("end_line", line_no):
-            if chosen is None or item["start_line"] >= chosen["start_line"]:
-                chosen = item
-    return chosen["name"] if chosen else "(unknown)"
-
-
-def parse_functions(lines: List[str], contract_ranges: List[Dict[str, int]]) -> List[Dict[str, str]]:
+        while stack and brace_depth <= stack[-1][2]:
+            name, start_line, _ = stack.pop()
+            closed.append((start_line, idx, name))
+
+    # Contracts close inner-first; order by start so lookups can bisect.
+    closed.sort()
+    return ContractRanges(
+        names=[name for _, _, name in closed],
+        start_lines=[start for start, _, _ in closed],
+        end_lines=[end for _, end, _ in closed],
+    )
+
+
+def make_contract_lookup(ranges: ContractRanges) -> Callable[[int], str]:
+    """Build a line -> innermost contract name lookup.
+
+    Queries arrive in increasing line order, so the last hit is tried first
+    and the bisect only runs when the line leaves that contract.
+    """
+    names, start_lines, end_lines = ranges
+    last_idx = -1
+
+    def lookup(line_no: int) -> str:
+        nonlocal last_idx
+        idx = last_idx
+        if (
+            idx >= 0
+            and start_lines[idx] <= line_no <= end_lines[idx]
+            and (idx + 1 == len(start_lines) or start_lines[idx + 1] > line_no)
+        ):
+            return names[idx]
+
+        idx = bisect_right(start_lines, line_no) - 1
+        while idx >= 0 and end_lines[idx] < line_no:
+            idx -= 1
+        if idx < 0:
+            return "(unknown)"
+        last_idx = idx
+        return names[idx]
+
+    return lookup
+
+
+def parse_functions(lines: List[str], contract_ranges: ContractRanges) -> List[Dict[str, str]]:
     entries: List[Dict[str, str]] = []
+    find_contract = make_contract_lookup(contract_ranges)
 
     idx = 0
     total = len(lines)
     while idx < total:
         line = lines[idx]
-        if "function" in line or "fallback" in line or "receive" in line:
-            sig_lines = [line]
-            j = idx
-            while j < total and "{" not in lines[j] and ";" not in lines[j]:
-                j += 1
-                if j < total:
-                    sig_lines.append(lines[j])
-            signature = " ".join(s.strip() for s in sig_lines)
-
-            func_match = re.search(r"\bfunction\s+(\w+)\s*\(([^)]*)\)\s*([^;{]*)", signature)
-            fallback_match = re.search(r"\b(fallback|receive)\s*\(([^)]*)\)\s*([^;{]*)", signature)
-
-            if func_match or fallback_match:
-                if func_match:
-                    name = func_match.group(1)
-                    params = func_match.group(2).strip()
-                    tail = func_match.group(3).strip()
-                else:
-                    name = fallback_match.group(1)
-                    params = fallback_match.group(2).strip()
-                    tail = fallback_match.group(3).strip()
-
-                visibility = next((v for v in VISIBILITY_KEYWORDS if v in tail), "")
-                if name in {"fallback", "receive"} and not visibility:
-                    visibility = "external"
-
-                attributes = []
-                for attr in ATTRIBUTE_KEYWORDS:
-                    if attr in tail:
-                        attributes.append(attr)
-
-                entries.append({
-                    "contract": find_contract_for_line(contract_ranges, idx + 1),
-                    "function": name,
-                    "params": params,
-                    "visibility": visibility,
-                    "attributes": " ".join(attributes),
-                    "raw_tail": tail,
-                    "line": idx + 1,
-                })
-            idx = j
-        idx += 1
+        if "function" not in line and "fallback" not in line and "receive" not in line:
+            idx += 1
+            continue
+
+        # The signature runs up to the first line that opens a body or ends a declaration.
+        j = idx
+        while j < total and "{" not in lines[j] and ";" not in lines[j]:
+            j += 1
+        signature = " ".join(s.strip() for s in lines[idx:j + 1])
+
+        func_match = _FUNC_RE.search(signature)
+        fallback_match = _FALLBACK_RE.search(signature)
+
+        if func_match or fallback_match:
+            if func_match:
+                name = func_match.group(1)
+                params = func_match.group(2).strip()
+                tail = func_match.group(3).strip()
+            else:
+                name = fallback_match.group(1)
+                params = fallback_match.group(2).strip()
+                tail = fallback_match.group(3).strip()
+
+            visibility = next((v for v in VISIBILITY_KEYWORDS if v in tail), "")
+            if name in {"fallback", "receive"} and not visibility:
+                visibility = "external"
+
+            attributes = []
+            for attr in ATTRIBUTE_KEYWORDS:
+                if attr in tail:
+                    attributes.append(attr)
+
+            entries.append({
+                "contract": find_contract(idx + 1),
+                "function": name,
+                "params": params,
+                "visibility": visibility,
+                "attributes": " ".join(attributes),
+                "raw_tail": tail,
+                "line": idx + 1,
+            })
+        idx = j + 1
 
     return entries
 
 
-def parse_external_calls(lines: List[str]) -> List[Dict[str, str]]:
+def parse_external_calls(text: str) -> List[Dict[str, str]]:
     results: List[Dict[str, str]] = []
-    for idx, line in enumerate(lines, start=1):
-        trimmed = line.strip()
-        if not trimmed:
+    line_no = 1
+    line_start = 0
+    scanned = 0
+
+    rank = EXTERNAL_CALL_RE.groupindex
+
+    for match in EXTERNAL_CALL_RE.finditer(text):
+        label = match.lastgroup
+        assert label is not None  # every alternative is a named group
+        pos = match.start()
+        newlines = text.count("\n", scanned, pos)
+        scanned = pos
+        # Report each line once, labelled by its highest-precedence call.
+        if results and not newlines:
+            if rank[label] < rank[results[-1]["pattern"]]:
+                results[-1]["pattern"] = label
             continue
-        for pattern, label in EXTERNAL_CALL_PATTERNS:
-            if pattern.search(trimmed):
-                results.append({
-                    "line": idx,
-                    "pattern": label,
-                    "snippet": trimmed[:120],
-                })
-                break
+        line_no += newlines
+        if newlines:
+            line_start = text.rfind("\n", 0, pos) + 1
+        line_end = text.find("\n", pos)
+        if line_end < 0:
+            line_end = len(text)
+        results.append({
+            "line": line_no,
+            "pattern": label,
+            "snippet": text[line_start:line_end].strip()[:120],
+        })
     return results
 
 
@@ -254,11 +312,45 @@ def render_markdown(entries: List[Dict[str, str]], callsites: Dict[str, List[Dic
     return "\n".join(lines)
 
 
+def process_file(file_path: Path) -> Tuple[List[Dict[str, str]], List[Dict[str, str]]]:
+    """Map one Solidity file to its (entrypoints, external call sites)."""
+    try:
+        data = file_path.read_bytes()
+    except OSError:
+        return [], []
+    try:
+        text = data.decode("utf-8")
+    except UnicodeDecodeError:
+        text = data.decode("utf-8", errors="ignore")
+    # read_bytes skips newline translation; downstream counts "\n" only.
+    if "\r" in text:
+        text = text.replace("\r\n", "\n").replace("\r", "\n")
+
+    stripped_text = strip_comments_keep_lines(text)
+    stripped_lines = stripped_text.splitlines()
+    contract_ranges = compute_contract_ranges(stripped_lines)
+    file_entries = parse_functions(stripped_lines, contract_ranges)
+    for entry in file_entries:
+        entry["file"] = str(file_path)
+
+    return file_entries, parse_external_calls(stripped_text)
+
+
+def positive_int(value: str) -> int:
+    """argparse type for counts that must be at least 1."""
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {number}")
+    return number
+
+
 def main() -> None:
     parser = argparse.ArgumentParser(description="Generate attack surface map for Solidity codebases")
     parser.add_argument("--root", default=None, help="Root directory to scan (default: ./target if exists, else .)")
     parser.add_argument("--output", default="findings/attack_surface.md", help="Markdown output file")
     parser.add_argument("--json", dest="json_output", default="", help="Optional JSON output file")
+    parser.add_argument("--compact-json", action="store_true", help="Write JSON without indentation")
+    parser.add_argument("--jobs", type=positive_int, default=None, help="Worker processes (default: CPU count)")
 
     args = parser.parse_args()
 
@@ -275,23 +367,21 @@ def main() -> None:
     all_entries: List[Dict[str, str]] = []
     all_callsites: Dict[str, List[Dict[str, str]]] = {}
 
-    for file_path in sol_files:
-        try:
-            raw_lines = file_path.read_text(encoding="utf-8").splitlines()
-        except Exception:
-            continue
-
-        stripped_lines = strip_comments_keep_lines(raw_lines)
-        contract_ranges = compute_contract_ranges(stripped_lines)
-        file_entries = parse_functions(stripped_lines, contract_ranges)
-
-        for entry in file_entries:
-            entry["file"] = str(file_path)
-            all_entries.append(entry)
-
-        callsites = parse_external_calls(stripped_lines)
-        if callsites:
-            all_callsites[str(file_path)] = callsites
+    if len(sol_files) > 1 and args.jobs != 1:
+        executor = ProcessPoolExecutor(max_workers=args.jobs)
+        results = executor.map(process_file, sol_files, chunksize=8)
+    else:
+        executor = None
+        results = map(process_file, sol_files)
+
+    try:
+        for file_path, (file_entries, callsites) in zip(sol_files, results):
+            all_entries.extend(file_entries)
+            if callsites:
+                all_callsites[str(file_path)] = callsites
+    finally:
+        if executor is not None:
+            executor.shutdown()
 
     output_path = Path(args.output)
     output_path.parent.mkdir(parents=True, exist_ok=True)
@@ -301,15 +391,15 @@ def main() -> None:
     if args.json_output:
         json_path = Path(args.json_output)
         json_path.parent.mkdir(parents=True, exist_ok=True)
-        json_path.write_text(
-            json.dumps({
+        with json_path.open("w", encoding="utf-8") as fh:
+            json.dump({
                 "generated": datetime.utcnow().isoformat() + "Z",
                 "root": root_dir,
                 "entrypoints": all_entries,
                 "external_calls": all_callsites,
-            }, indent=2),
-            encoding="utf-8",
-        )
+            }, fh,
+                indent=None if args.compact_json else 2,
+                separators=(",", ":") if args.compact_json else None)
 
     print(f"✅ Attack surface map written to {output_path}")
 
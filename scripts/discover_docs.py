@@ -5,16 +5,39 @@ Uses a lightweight web search to locate official documentation pages.
 """
 
 import argparse
+import hashlib
 import json
 import os
 import re
 import sys
+import threading
 import time
 import urllib.parse
-import urllib.request
-from typing import Dict, List, Tuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from html import unescape
+from typing import Callable, Dict, List, Optional, TextIO, Tuple, Union
+
+import requests
+from requests.adapters import HTTPAdapter
 
 USER_AGENT = "RalphDocsDiscovery/1.0"
+CACHE_TTL_SECONDS = 7 * 24 * 3600
+MAX_POOL_CONNECTIONS = 16
+
+INTEGRATION_NAME_PATTERNS = [
+    re.compile(r"^#+\s*Integration\s*:\s*(.+)", re.IGNORECASE),
+    re.compile(r"^\s*[-*+]\s*Integration\s*:\s*(.+)", re.IGNORECASE),
+    re.compile(r"^Integration\s*:\s*(.+)", re.IGNORECASE),
+    re.compile(r"^#+\s*(.+)\s*\(Integration\)", re.IGNORECASE),
+]
+
+# DuckDuckGo result links are redirects, usually protocol-relative.
+DDG_REDIRECT_RE = re.compile(r'href="((?:https:)?//duckduckgo\.com/l/\?[^"]+)"')
+
+# Shared keep-alive session so repeated searches reuse TCP/TLS connections.
+_SESSION = requests.Session()
+_SESSION.headers["User-Agent"] = USER_AGENT
+_SESSION.mount("https://", HTTPAdapter(pool_maxsize=MAX_POOL_CONNECTIONS))
 
 
 def read_integration_names(path: str) -> List[str]:
@@ -22,19 +45,13 @@ def read_integration_names(path: str) -> List[str]:
         return []
 
     names: List[str] = []
-    patterns = [
-        re.compile(r"^#+\\s*Integration\\s*:\\s*(.+)", re.IGNORECASE),
-        re.compile(r"^\\s*[-*+]\\s*Integration\\s*:\\s*(.+)", re.IGNORECASE),
-        re.compile(r"^Integration\\s*:\\s*(.+)", re.IGNORECASE),
-        re.compile(r"^#+\\s*(.+)\\s*\\(Integration\\)", re.IGNORECASE),
-    ]
 
     with open(path, "r", encoding="utf-8") as fh:
         for line in fh:
             line = line.strip()
             if not line:
                 continue
-            for pattern in patterns:
+            for pattern in INTEGRATION_NAME_PATTERNS:
                 match = pattern.search(line)
                 if match:
                     name = match.group(1).strip()
@@ -52,16 +69,52 @@ def read_integration_names(path: str) -> List[str]:
     return deduped
 
 
-def fetch_html(url: str, timeout: int = 20) -> str:
-    req = urllib.request.Request(url, headers={"User-Agent": USER_AGENT})
-    with urllib.request.urlopen(req, timeout=timeout) as resp:
-        return resp.read().decode("utf-8", errors="ignore")
+def fetch_html(
+    url: str,
+    timeout: int = 20,
+    cache_dir: str = "",
+    refresh: bool = False,
+    cache_if: Optional[Callable[[str], bool]] = None,
+) -> str:
+    """Fetch a page, reusing a copy under cache_dir younger than CACHE_TTL_SECONDS.
+
+    Fetched pages are cached only if cache_if (when given) accepts them.
+    """
+    cache_path = ""
+    if cache_dir:
+        digest = hashlib.sha1(url.encode("utf-8")).hexdigest()
+        cache_path = os.path.join(cache_dir, f"{digest}.html")
+        if not refresh:
+            try:
+                if time.time() - os.path.getmtime(cache_path) < CACHE_TTL_SECONDS:
+                    with open(cache_path, "r", encoding="utf-8") as fh:
+                        return fh.read()
+            except OSError:
+                pass
+
+    resp = _SESSION.get(url, timeout=timeout)
+    resp.raise_for_status()
+    html = resp.content.decode("utf-8", errors="ignore")
+
+    if cache_path and (cache_if is None or cache_if(html)):
+        # Written aside and renamed, so an interrupted write is never served
+        tmp_path = f"{cache_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            with open(tmp_path, "w", encoding="utf-8") as fh:
+                fh.write(html)
+            os.replace(tmp_path, cache_path)
+        except OSError:
+            pass  # Caching is best effort
+    return html
 
 
 def extract_duckduckgo_links(html: str) -> List[str]:
     links: List[str] = []
-    for match in re.finditer(r'href=\"(https://duckduckgo.com/l/\\?[^\\\"]+)\"', html):
-        redirect_url = match.group(1)
+    for match in DDG_REDIRECT_RE.finditer(html):
+        redirect_url = unescape(match.group(1))
+        if redirect_url.startswith("//"):
+            redirect_url = "https:" + redirect_url
         parsed = urllib.parse.urlparse(redirect_url)
         params = urllib.parse.parse_qs(parsed.query)
         uddg = params.get("uddg")
@@ -85,19 +138,17 @@ def pick_best_doc_link(links: List[str], allowlist: List[str]) -> str:
     if not links:
         return ""
 
-    filtered = links
-    if allowlist:
-        filtered = []
-        for link in links:
-            for domain in allowlist:
-                if domain and domain.lower() in link.lower():
-                    filtered.append(link)
-                    break
+    lowered_links = [(link.lower(), link) for link in links]
+    lowered_domains = tuple(domain.lower() for domain in allowlist if domain)
+    if lowered_domains:
+        filtered = [
+            pair for pair in lowered_links
+            if any(domain in pair[0] for domain in lowered_domains)
+        ]
         if filtered:
-            links = filtered
+            lowered_links = filtered
 
-    def score(link: str) -> int:
-        lowered = link.lower()
+    def score(lowered: str) -> int:
         score_val = 0
         if "docs" in lowered:
             score_val += 3
@@ -111,18 +162,24 @@ def pick_best_doc_link(links: List[str], allowlist: List[str]) -> str:
             score_val -= 2
         return score_val
 
-    ranked = sorted(links, key=score, reverse=True)
-    for link in ranked:
-        if "wikipedia.org" in link.lower():
+    ranked = sorted(lowered_links, key=lambda pair: score(pair[0]), reverse=True)
+    for lowered, link in ranked:
+        if "wikipedia.org" in lowered:
             continue
         return link
-    return ranked[0]
+    return ranked[0][1]
 
 
-def discover_docs_for_name(name: str, allowlist: List[str]) -> Tuple[str, List[str]]:
+def discover_docs_for_name(
+    name: str, allowlist: List[str], cache_dir: str = "", refresh: bool = False
+) -> Tuple[str, List[str]]:
     query = urllib.parse.quote(f"{name} documentation official docs")
     search_url = f"https://duckduckgo.com/html/?q={query}"
-    html = fetch_html(search_url)
+    # Rate-limit and captcha pages carry no results; don't pin them in the cache
+    html = fetch_html(
+        search_url, cache_dir=cache_dir, refresh=refresh,
+        cache_if=lambda page: bool(extract_duckduckgo_links(page)),
+    )
     links = extract_duckduckgo_links(html)
     best = pick_best_doc_link(links, allowlist)
     return best, links[:5]
@@ -151,6 +208,8 @@ def load_allowlist(path: str) -> Dict[str, List[str]]:
     return mapping
 
 
+# Discovery map keys are always lowercased integration names, both in memory
+# and on disk, so lookups by name.lower() never miss a persisted entry.
 def load_discovery_map(path: str) -> Dict[str, Dict[str, str]]:
     if not path or not os.path.exists(path):
         return {}
@@ -158,15 +217,16 @@ def load_discovery_map(path: str) -> Dict[str, Dict[str, str]]:
         with open(path, "r", encoding="utf-8") as fh:
             data = json.load(fh)
         if isinstance(data, dict):
-            return data
+            return {key.lower(): value for key, value in data.items()}
     except Exception:
         return {}
     return {}
 
 
 def save_discovery_map(path: str, data: Dict[str, Dict[str, str]]) -> None:
+    normalized = {key.lower(): value for key, value in data.items()}
     with open(path, "w", encoding="utf-8") as fh:
-        json.dump(data, fh, indent=2, sort_keys=True)
+        json.dump(normalized, fh, indent=2, sort_keys=True)
 
 
 def main() -> None:
@@ -177,6 +237,7 @@ def main() -> None:
     parser.add_argument("--allowlist", default="specs/external_docs/allowlist.txt")
     parser.add_argument("--state", default="specs/external_docs/discovery.json")
     parser.add_argument("--refresh", action="store_true")
+    parser.add_argument("--max-concurrency", type=int, default=8, help="Parallel search requests")
     args = parser.parse_args()
 
     names = read_integration_names(args.integrations_file)
@@ -188,30 +249,77 @@ def main() -> None:
     os.makedirs(os.path.dirname(args.log), exist_ok=True)
     os.makedirs(os.path.dirname(args.state), exist_ok=True)
 
+    cache_dir = os.path.join(os.path.dirname(args.state), "http_cache")
     allowlist_map = load_allowlist(args.allowlist)
     discovery_map = load_discovery_map(args.state)
     urls: List[str] = []
-    with open(args.log, "w", encoding="utf-8") as logf:
-        for name in names:
-            key = name.lower()
-            if not args.refresh and key in discovery_map:
-                existing = discovery_map[key].get("url", "")
-                if existing:
-                    urls.append(existing)
-                    logf.write(f"{name}: {existing} (cached)\\n")
-                    continue
-
+    pending: List[str] = []
+    for name in names:
+        key = name.lower()
+        if args.refresh or not discovery_map.get(key, {}).get("url", ""):
+            pending.append(name)
+
+    # Completed searches go into discovery_map as they finish and queued ones
+    # are cancelled on error, so saving in finally keeps every name found
+    # before an interrupt; the next run serves those from the state file.
+    outcomes: Dict[str, Union[Tuple[str, List[str]], Exception]] = {}
+    pending_names = set(pending)
+    reported = 0
+
+    def report_ready(logf: TextIO) -> None:
+        """Log, in input order, every name up to the first search still running."""
+        nonlocal reported
+        while reported < len(names):
+            name = names[reported]
+            if name not in pending_names:
+                existing = discovery_map[name.lower()]["url"]
+                urls.append(existing)
+                logf.write(f"{name}: {existing} (cached)\n")
+            elif name not in outcomes:
+                return
+            else:
+                outcome = outcomes[name]
+                if isinstance(outcome, Exception):
+                    logf.write(f"{name}: error ({outcome})\n")
+                else:
+                    best, sample = outcome
+                    logf.write(f"{name}: {best}\n")
+                    for candidate in sample:
+                        logf.write(f"  - {candidate}\n")
+                    if best:
+                        urls.append(best)
+            reported += 1
+
+    # The log is line-buffered so progress can be tailed during the run.
+    try:
+        with open(args.log, "w", encoding="utf-8", buffering=1) as logf, \
+                ThreadPoolExecutor(max_workers=max(1, args.max_concurrency)) as executor:
+            # Searches are network-bound, so overlap them and record each one
+            # as it completes; queued searches are dropped on error.
+            futures = {
+                executor.submit(
+                    discover_docs_for_name, name, allowlist_map.get(name.lower(), []), cache_dir, args.refresh
+                ): name
+                for name in pending
+            }
             try:
-                allow_domains = allowlist_map.get(key, [])
-                best, sample = discover_docs_for_name(name, allow_domains)
-                logf.write(f"{name}: {best}\\n")
-                for candidate in sample:
-                    logf.write(f"  - {candidate}\\n")
-                if best:
-                    urls.append(best)
-                    discovery_map[key] = {"url": best, "ts": str(int(time.time()))}
-            except Exception as exc:
-                logf.write(f"{name}: error ({exc})\\n")
+                report_ready(logf)
+                for future in as_completed(futures):
+                    name = futures[future]
+                    try:
+                        best, sample = future.result()
+                    except Exception as exc:
+                        outcomes[name] = exc
+                    else:
+                        outcomes[name] = (best, sample)
+                        if best:
+                            discovery_map[name.lower()] = {"url": best, "ts": str(int(time.time()))}
+                    report_ready(logf)
+            except BaseException:
+                executor.shutdown(wait=False, cancel_futures=True)
+                raise
+    finally:
+        save_discovery_map(args.state, discovery_map)
 
     # Deduplicate URLs
     deduped = []
@@ -223,9 +331,8 @@ def main() -> None:
 
     with open(args.urls_file, "w", encoding="utf-8") as outf:
         for url in deduped:
-            outf.write(url + "\\n")
+            outf.write(url + "\n")
 
-    save_discovery_map(args.state, discovery_map)
     print(f"Discovered {len(deduped)} docs URLs -> {args.urls_file}")
 
 
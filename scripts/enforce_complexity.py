@@ -8,8 +8,11 @@ import os
 import ast
 import sys
 import re
+import hashlib
+import json
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from typing import List, Tuple, Optional
+from typing import Any, Callable, Dict, Iterator, List, Optional, Pattern, Set, Tuple
 
 # Configuration: The "20/200" Rule
 MAX_FILE_LINES = 200
@@ -19,6 +22,28 @@ MAX_NESTING = 3
 MAX_STATE_VARIABLES = 15
 MAX_EXTERNAL_CALLS = 5
 
+# Python files longer than this only get the file length check
+AST_SKIP_LINES = MAX_FILE_LINES * 5
+
+# Solidity patterns
+STATE_VAR_RE = re.compile(r'^\s*(uint|int|address|bool|mapping|struct|enum)\s+(\w+)\s*;', re.MULTILINE)
+EXTERNAL_CALL_RE = re.compile(r'\.(?:call\{value:|delegatecall|staticcall|transfer\(|send\()')
+
+# Persistent per-file results, keyed by content hash. They live in .agent/,
+# which the installer already adds to projects. The schema ties them to this
+# script, the interpreter and the limits; any change discards the store.
+CACHE_DIR = os.path.join('.agent', 'complexity-cache')
+CACHE_FILE = os.path.join(CACHE_DIR, 'results.json')
+CACHE_SCHEMA = '|'.join(map(str, (
+    hashlib.sha256(Path(__file__).read_bytes()).hexdigest(),
+    '.'.join(map(str, sys.version_info[:2])),
+    MAX_FILE_LINES, MAX_FUNCTION_LINES, MAX_PARAMS, MAX_NESTING,
+    MAX_EXTERNAL_CALLS, MAX_STATE_VARIABLES,
+)))
+
+# Below this many files scan_directory stays in-process
+PARALLEL_MIN_FILES = 50
+
 # Colors
 RED = "\033[91m"
 GREEN = "\033[92m"
@@ -31,27 +56,46 @@ class SecurityComplexityChecker(ast.NodeVisitor):
     """AST visitor to check for security-relevant complexity metrics"""
     
     def __init__(self, filepath: str):
-        self.filepath = filepath
-        self.violations = []
-        self.current_function = None
-        self.external_calls = 0
-        self.state_modifications = 0
-        self.require_statements = 0
+        self.filepath: str = filepath
+        self.violations: List[dict] = []
+        self.current_function: Optional[str] = None
+        self.external_calls: int = 0
+        self.state_modifications: int = 0
+        self.require_statements: int = 0
+        self.nesting_depth: int = 0
+        self.max_nesting: int = 0
+        self._visitors: Dict[type, Callable[[Any], None]] = {}
+    
+    def visit(self, node: ast.AST) -> None:
+        """Dispatch through a per-type cache instead of a getattr per node"""
+        node_type = type(node)
+        method = self._visitors.get(node_type)
+        if method is None:
+            method = self._visitors[node_type] = getattr(
+                self, 'visit_' + node_type.__name__, self.generic_visit)
+        method(node)
+    
+    def generic_visit(self, node: ast.AST) -> None:
+        """Visit direct children without NodeVisitor's per-field bookkeeping"""
+        for child in ast.iter_child_nodes(node):
+            self.visit(child)
         
-    def visit_FunctionDef(self, node):
+    def visit_FunctionDef(self, node: ast.FunctionDef) -> None:
         """Analyze function definition"""
         old_function = self.current_function
         old_external_calls = self.external_calls
         old_state_mods = self.state_modifications
         old_requires = self.require_statements
+        old_max_nesting = self.max_nesting
         
         self.current_function = node.name
         self.external_calls = 0
         self.state_modifications = 0
         self.require_statements = 0
+        self.max_nesting = self.nesting_depth
         
         # Check function length
-        lines = node.end_lineno - node.lineno + 1
+        lines = (node.end_lineno or node.lineno) - node.lineno + 1
         if lines > MAX_FUNCTION_LINES:
             self.violations.append({
                 'type': 'function_length',
@@ -79,10 +123,15 @@ class SecurityComplexityChecker(ast.NodeVisitor):
                 'severity': 'warning'
             })
         
+        # Continue visiting; nesting depth is tracked along the way
+        nesting_index = len(self.violations)
+        base_depth = self.nesting_depth
+        self.generic_visit(node)
+        
         # Check nesting depth
-        max_nesting = self._get_max_nesting(node)
+        max_nesting = self.max_nesting - base_depth
         if max_nesting > MAX_NESTING:
-            self.violations.append({
+            self.violations.insert(nesting_index, {
                 'type': 'nesting_depth',
                 'name': node.name,
                 'value': max_nesting,
@@ -91,9 +140,6 @@ class SecurityComplexityChecker(ast.NodeVisitor):
                 'severity': 'warning'
             })
         
-        # Continue visiting
-        self.generic_visit(node)
-        
         # Check for unprotected external calls (simulated for Python)
         if self.external_calls > MAX_EXTERNAL_CALLS:
             self.violations.append({
@@ -121,8 +167,10 @@ class SecurityComplexityChecker(ast.NodeVisitor):
         self.external_calls = old_external_calls
         self.state_modifications = old_state_mods
         self.require_statements = old_requires
+        # Blocks in nested functions also count toward the enclosing function
+        self.max_nesting = max(old_max_nesting, self.max_nesting)
     
-    def visit_Call(self, node):
+    def visit_Call(self, node: ast.Call) -> None:
         """Detect external calls and validation"""
         if isinstance(node.func, ast.Name):
             if node.func.id in ['open', 'requests', 'urllib', 'httpx']:
@@ -131,32 +179,19 @@ class SecurityComplexityChecker(ast.NodeVisitor):
                 self.require_statements += 1
         self.generic_visit(node)
     
-    def visit_Assign(self, node):
+    def visit_Assign(self, node: ast.Assign) -> None:
         """Detect state modifications"""
         self.state_modifications += 1
         self.generic_visit(node)
     
-    def _get_max_nesting(self, node) -> int:
-        """Calculate maximum nesting depth"""
-        max_depth = 0
-        
-        for child in ast.walk(node):
-            if isinstance(child, (ast.If, ast.For, ast.While, ast.With, ast.Try)):
-                depth = self._calculate_depth(node, child)
-                max_depth = max(max_depth, depth)
-        
-        return max_depth
+    def _visit_nesting(self, node: ast.stmt) -> None:
+        """Track block nesting depth"""
+        self.nesting_depth += 1
+        self.max_nesting = max(self.max_nesting, self.nesting_depth)
+        self.generic_visit(node)
+        self.nesting_depth -= 1
     
-    def _calculate_depth(self, root, target) -> int:
-        """Calculate depth of target node within root"""
-        # Simplified depth calculation
-        depth = 0
-        for node in ast.walk(root):
-            if node is target:
-                return depth
-            if isinstance(node, (ast.If, ast.For, ast.While)):
-                depth += 1
-        return depth
+    visit_If = visit_For = visit_While = visit_With = visit_Try = _visit_nesting
 
 
 def check_file_length(filepath: str, lines: List[str]) -> Tuple[bool, Optional[dict]]:
@@ -173,6 +208,13 @@ def check_file_length(filepath: str, lines: List[str]) -> Tuple[bool, Optional[d
     return True, None
 
 
+def count_matches(pattern: Pattern[str], text: str) -> int:
+    """Count regex matches without building the list of matched strings"""
+    count = 0
+    for _ in pattern.finditer(text):
+        count += 1
+    return count
+
 def analyze_solidity_file(filepath: str, content: str) -> List[dict]:
     """Analyze Solidity file for complexity and security issues"""
     violations = []
@@ -189,30 +231,19 @@ def analyze_solidity_file(filepath: str, content: str) -> List[dict]:
         })
     
     # Count state variables
-    state_var_pattern = r'^\s*(uint|int|address|bool|mapping|struct|enum)\s+(\w+)\s*;'
-    state_vars = re.findall(state_var_pattern, content, re.MULTILINE)
-    if len(state_vars) > MAX_STATE_VARIABLES:
+    state_vars = count_matches(STATE_VAR_RE, content)
+    if state_vars > MAX_STATE_VARIABLES:
         violations.append({
             'type': 'state_variables',
             'filepath': filepath,
-            'value': len(state_vars),
+            'value': state_vars,
             'limit': MAX_STATE_VARIABLES,
             'severity': 'warning',
-            'message': f'Too many state variables ({len(state_vars)})'
+            'message': f'Too many state variables ({state_vars})'
         })
     
     # Count external calls
-    external_patterns = [
-        r'\.call\{value:',
-        r'\.delegatecall',
-        r'\.staticcall',
-        r'\.transfer\(',
-        r'\.send\(',
-    ]
-    external_calls = sum(
-        len(re.findall(pattern, content))
-        for pattern in external_patterns
-    )
+    external_calls = count_matches(EXTERNAL_CALL_RE, content)
     
     if external_calls > MAX_EXTERNAL_CALLS:
         violations.append({
@@ -238,36 +269,85 @@ def analyze_solidity_file(filepath: str, content: str) -> List[dict]:
     return violations
 
 
-def check_file(filepath: str) -> List[dict]:
-    """Check a single file for complexity violations"""
-    violations = []
-    
+def analyze_python_file(filepath: str, content: str) -> List[dict]:
+    """Run the AST checker over Python source"""
+    try:
+        tree = ast.parse(content)
+    except SyntaxError:
+        return []  # Skip files with syntax errors
+    checker = SecurityComplexityChecker(filepath)
+    checker.visit(tree)
+    return checker.violations
+
+
+def load_results_cache() -> Dict[str, List[dict]]:
+    """Load stored results, discarding them if the schema has changed"""
+    try:
+        with open(CACHE_FILE, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if not isinstance(data, dict) or data.get('schema') != CACHE_SCHEMA:
+        return {}
+    results = data.get('results')
+    return results if isinstance(results, dict) else {}
+
+
+def save_results_cache(results: Dict[str, List[dict]]):
+    """Persist results for the files seen in this run"""
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        tmp_path = f"{CACHE_FILE}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'schema': CACHE_SCHEMA, 'results': results}, f)
+        os.replace(tmp_path, CACHE_FILE)
+    except OSError:
+        pass  # Caching is best effort
+
+
+def result_key(filepath: str, content: str) -> str:
+    """Cache key for a file's results; violations carry the path, so it is hashed too"""
+    return hashlib.sha256(f"{filepath}\0{content}".encode('utf-8', 'surrogatepass')).hexdigest()
+
+
+def read_source(filepath: str) -> Tuple[str, Optional[dict]]:
+    """Read a file, returning (content, None) or ("", read_error violation)"""
     try:
         with open(filepath, 'r', encoding='utf-8') as f:
-            content = f.read()
-            lines = content.splitlines()
+            return f.read(), None
     except Exception as e:
-        return [{
+        return "", {
             'type': 'read_error',
             'filepath': filepath,
             'message': str(e),
             'severity': 'error'
-        }]
+        }
+
+
+def check_file(filepath: str) -> List[dict]:
+    """Check a single file for complexity violations"""
+    content, error = read_source(filepath)
+    if error is not None:
+        return [error]
+    return check_source(filepath, content)
+
+
+def check_source(filepath: str, content: str) -> List[dict]:
+    """Check already-read file content for complexity violations"""
+    violations = []
     
     # Check file length
+    lines = content.splitlines()
     passed, violation = check_file_length(filepath, lines)
-    if not passed:
+    if not passed and violation is not None:
         violations.append(violation)
     
     # Language-specific analysis
     if filepath.endswith('.py'):
-        try:
-            tree = ast.parse(content)
-            checker = SecurityComplexityChecker(filepath)
-            checker.visit(tree)
-            violations.extend(checker.violations)
-        except SyntaxError:
-            pass  # Skip files with syntax errors
+        # Far past the limit (generated/vendored code) the length error is the
+        # actionable result, so skip the costly parse
+        if len(lines) <= AST_SKIP_LINES:
+            violations.extend(analyze_python_file(filepath, content))
     
     elif filepath.endswith('.sol'):
         violations.extend(analyze_solidity_file(filepath, content))
@@ -275,31 +355,71 @@ def check_file(filepath: str) -> List[dict]:
     return violations
 
 
+def _iter_files(root: str, skip_dirs: Set[str], extensions: Set[str]) -> Iterator[str]:
+    """Yield files under root with a wanted extension, pruning skip_dirs"""
+    # Files of a directory come before its subdirectories, as with os.walk
+    subdirs: List[str] = []
+    try:
+        entries = os.scandir(root)
+    except OSError:
+        return
+    with entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                if entry.name not in skip_dirs:
+                    subdirs.append(entry.path)
+            elif entry.is_file():
+                _, dot, ext = entry.name.rpartition('.')
+                if dot and '.' + ext in extensions:
+                    yield entry.path
+    for subdir in subdirs:
+        yield from _iter_files(subdir, skip_dirs, extensions)
+
+
 def scan_directory(directory: str = '.') -> Tuple[int, int, List[dict]]:
     """Scan directory for complexity violations"""
     all_violations = []
-    file_count = 0
     error_count = 0
     
     skip_dirs = {'.git', 'node_modules', 'venv', '.venv', '__pycache__', 'target'}
     extensions = {'.py', '.sol', '.js', '.ts'}
     
-    for root, dirs, files in os.walk(directory):
-        # Skip certain directories
-        dirs[:] = [d for d in dirs if d not in skip_dirs]
-        
-        for name in files:
-            ext = os.path.splitext(name)[1]
-            if ext in extensions:
-                filepath = os.path.join(root, name)
-                file_count += 1
-                
-                violations = check_file(filepath)
-                if violations:
-                    error_count += len([v for v in violations if v.get('severity') == 'error'])
-                    all_violations.extend(violations)
+    paths = list(_iter_files(directory, skip_dirs, extensions))
+    
+    # Unchanged files reuse stored results; only the rest are analyzed
+    cache = load_results_cache()
+    seen: Dict[str, List[dict]] = {}
+    results: List[List[dict]] = [[] for _ in paths]
+    misses = []
+    for i, path in enumerate(paths):
+        content, error = read_source(path)
+        if error is not None:
+            results[i] = [error]
+            continue
+        key = result_key(path, content)
+        if key in cache:
+            results[i] = seen[key] = cache[key]
+        else:
+            misses.append((i, path, content, key))
+    
+    # Files are independent and CPU-bound; small batches aren't worth the pool startup
+    miss_paths = [path for _, path, _, _ in misses]
+    miss_contents = [content for _, _, content, _ in misses]
+    if len(misses) < PARALLEL_MIN_FILES:
+        fresh = [check_source(path, content) for path, content in zip(miss_paths, miss_contents)]
+    else:
+        with ProcessPoolExecutor() as executor:
+            fresh = list(executor.map(check_source, miss_paths, miss_contents, chunksize=32))
+    for (i, _, _, key), violations in zip(misses, fresh):
+        results[i] = seen[key] = violations
+    save_results_cache(seen)
+    
+    for file_violations in results:
+        if file_violations:
+            error_count += len([v for v in file_violations if v.get('severity') == 'error'])
+            all_violations.extend(file_violations)
     
-    return file_count, error_count, all_violations
+    return len(paths), error_count, all_violations
 
 
 def print_violations(violations: List[dict]):
@@ -4,10 +4,11 @@ import argparse
 import json
 import re
 import subprocess
-from dataclasses import dataclass, asdict
+from dataclasses import dataclass
 from datetime import datetime, timezone
+from functools import lru_cache
 from pathlib import Path
-from typing import Dict, List, Tuple
+from typing import Dict, List, Pattern, Tuple
 
 
 TEXT_SUFFIXES = {
@@ -23,6 +24,8 @@ TEXT_SUFFIXES = {
     ".py",
 }
 
+BINARY_SNIFF_BYTES = 8192
+
 IGNORED_DIR_NAMES = {
     ".git",
     ".hg",
@@ -74,6 +77,95 @@ DEFAULT_PATTERNS: Dict[str, List[str]] = {
 }
 
 
+
+def required_literal(pattern: str) -> str:
+    """Longest lowercase literal that every match of pattern must contain.
+
+    Returns "" when no literal can be proven (alternation, groups or escapes
+    with a payload), in which case the caller must always run the regex.
+    """
+    runs: List[str] = []
+    current: List[str] = []
+    i = 0
+    while i < len(pattern):
+        c = pattern[i]
+        if c in "|()":
+            return ""
+        if c == "\\" and i + 1 < len(pattern):
+            nxt = pattern[i + 1]
+            i += 2
+            if nxt in "xuUN" or nxt.isdigit():
+                # Hex, unicode, named, octal and backreference escapes carry a
+                # payload that must not be read as literal text.
+                return ""
+            if nxt.isalnum():
+                runs.append("".join(current))
+                current = []
+            else:
+                current.append(nxt)
+            continue
+        if c in "*?+{":
+            # The quantified atom may be absent or repeated; drop it from the run.
+            if current:
+                current.pop()
+            runs.append("".join(current))
+            current = []
+            if c == "{":
+                close = pattern.find("}", i)
+                i = close + 1 if close >= 0 else len(pattern)
+                continue
+        elif c == "[":
+            runs.append("".join(current))
+            current = []
+            i += 1
+            if pattern[i:i + 1] == "^":
+                i += 1
+            if pattern[i:i + 1] == "]":
+                i += 1
+            while i < len(pattern) and pattern[i] != "]":
+                i += 2 if pattern[i] == "\\" else 1
+            i += 1
+            continue
+        elif c in ".^$":
+            runs.append("".join(current))
+            current = []
+        else:
+            current.append(c)
+        i += 1
+    runs.append("".join(current))
+    return max(runs, key=len).lower()
+
+
+def compile_patterns(
+    patterns: List[str],
+) -> Tuple[Pattern[bytes], Tuple[Tuple[bytes, Pattern[bytes]], ...]]:
+    """Compile a standard's patterns into one fused bytes regex plus one per pattern.
+
+    The fused alternation finds files with any match in a single pass; hits
+    are then counted per pattern, each paired with its required literal, so
+    text matched by two patterns counts once for each of them.
+    """
+    combined = "|".join(f"(?:{p})" for p in patterns)
+    counted = tuple(
+        (required_literal(p).encode("utf-8"), re.compile(p.encode("utf-8"), re.IGNORECASE))
+        for p in patterns
+    )
+    return re.compile(combined.encode("utf-8"), re.IGNORECASE), counted
+
+
+def count_matches(rx: Pattern[bytes], data: bytes) -> int:
+    """Count matches of rx in data without materializing them."""
+    count = 0
+    for _ in rx.finditer(data):
+        count += 1
+    return count
+
+
+COMPILED_PATTERNS: Dict[str, Tuple[Pattern[bytes], Tuple[Tuple[bytes, Pattern[bytes]], ...]]] = {
+    key: compile_patterns(patterns) for key, patterns in DEFAULT_PATTERNS.items()
+}
+
+
 @dataclass
 class Heuristic:
     cls: str
@@ -89,7 +181,31 @@ class StandardEntry:
     patterns: List[str]
 
 
+def read_git_head(path: Path) -> str:
+    """Resolve HEAD from path/.git without spawning git; "" if it can't."""
+    git_dir = path / ".git"
+    try:
+        head = (git_dir / "HEAD").read_text(encoding="utf-8").strip()
+        if not head.startswith("ref: "):
+            return head
+        ref = head[len("ref: "):]
+        ref_file = git_dir / ref
+        if ref_file.is_file():
+            return ref_file.read_text(encoding="utf-8").strip()
+        for line in (git_dir / "packed-refs").read_text(encoding="utf-8").splitlines():
+            sha, _, name = line.partition(" ")
+            if name == ref:
+                return sha
+    except OSError:
+        pass
+    return ""
+
+
+@lru_cache(maxsize=8)
 def git_rev(path: Path) -> str:
+    sha = read_git_head(path)
+    if sha:
+        return sha[:7]
     try:
         out = subprocess.check_output(
             ["git", "-C", str(path), "rev-parse", "--short", "HEAD"],
@@ -144,21 +260,50 @@ def list_text_files(target_dir: Path, max_file_bytes: int) -> List[Path]:
     return files
 
 
-def score_entry(entry: StandardEntry, files: List[Path]) -> Tuple[int, List[str], int]:
-    regexes = [re.compile(p, re.IGNORECASE) for p in entry.patterns]
-    matched_files: List[str] = []
-    total_hits = 0
+def load_documents(files: List[Path]) -> List[Tuple[str, bytes]]:
+    """Read each target file once as (path, lowercased bytes).
 
+    Patterns are case-insensitive, so the lowercased copy is the only one
+    kept: the literal gate and the regexes both run on it. Files that look
+    binary (a NUL in the first 8 KiB) are dropped.
+    """
+    docs: List[Tuple[str, bytes]] = []
     for fp in files:
         try:
-            data = fp.read_text(encoding="utf-8", errors="ignore")
+            data = fp.read_bytes()
         except Exception:
             continue
-        file_hits = 0
-        for rx in regexes:
-            file_hits += len(rx.findall(data))
+        if b"\0" in data[:BINARY_SNIFF_BYTES]:
+            continue
+        docs.append((str(fp), data.lower()))
+    return docs
+
+
+def score_entry(entry: StandardEntry, docs: List[Tuple[str, bytes]]) -> Tuple[int, List[str], int]:
+    compiled = COMPILED_PATTERNS.get(entry.key)
+    if compiled is None:
+        compiled = compile_patterns(entry.patterns)
+    any_rx, counted = compiled
+    # Without a literal for every pattern, no substring test can rule a file out.
+    literals = tuple(literal for literal, _ in counted)
+    if not all(literals):
+        literals = ()
+    matched_files: List[str] = []
+    total_hits = 0
+
+    for path, data in docs:
+        # No pattern can match if none of their required literals is present.
+        if literals and not any(literal in data for literal in literals):
+            continue
+        if any_rx.search(data) is None:
+            continue
+        file_hits = sum(
+            count_matches(rx, data)
+            for literal, rx in counted
+            if not literal or literal in data
+        )
         if file_hits > 0:
-            matched_files.append(str(fp))
+            matched_files.append(path)
             total_hits += file_hits
 
     score = len(matched_files) * 10 + min(total_hits, 100)
@@ -166,7 +311,6 @@ def score_entry(entry: StandardEntry, files: List[Path]) -> Tuple[int, List[str]
 
 
 def render_markdown(
-    entries: List[StandardEntry],
     scored: List[Tuple[StandardEntry, int, List[str], int]],
     handbook_root: Path,
     target_dir: Path,
@@ -187,8 +331,10 @@ def render_markdown(
         "|---|---:|---:|---:|",
     ]
 
-    for entry, score, matched_files, _ in scored:
-        lines.append(f"| `{entry.key}` | {score} | {len(matched_files)} | {len(entry.heuristics)} |")
+    lines.extend(
+        "| `%s` | %d | %d | %d |" % (entry.key, score, len(matched_files), len(entry.heuristics))
+        for entry, score, matched_files, _ in scored
+    )
 
     lines.extend(["", "## Actionable Checks", ""])
 
@@ -197,22 +343,23 @@ def render_markdown(
         relevant = scored[:6]
 
     for entry, score, matched_files, total_hits in relevant:
-        lines.append(f"### {entry.title} (`{entry.key}`)")
-        lines.append("")
-        lines.append(f"- relevance_score: {score}")
-        lines.append(f"- matched_files: {len(matched_files)}")
-        lines.append(f"- total_pattern_hits: {total_hits}")
-        lines.append(f"- source: `{entry.path}`")
+        lines.extend(
+            [
+                f"### {entry.title} (`{entry.key}`)",
+                "",
+                f"- relevance_score: {score}",
+                f"- matched_files: {len(matched_files)}",
+                f"- total_pattern_hits: {total_hits}",
+                f"- source: `{entry.path}`",
+            ]
+        )
         if matched_files:
             lines.append("- sample_matches:")
-            for m in matched_files[:8]:
-                lines.append(f"  - `{m}`")
+            lines.extend("  - `%s`" % m for m in matched_files[:8])
+        lines.append("- checklist:")
         if entry.heuristics:
-            lines.append("- checklist:")
-            for h in entry.heuristics:
-                lines.append(f"  - [{h.cls}] {h.text}")
+            lines.extend("  - [%s] %s" % (h.cls, h.text) for h in entry.heuristics)
         else:
-            lines.append("- checklist:")
             lines.append("  - No explicit heuristic entries parsed from source file.")
         lines.append("")
 
@@ -252,17 +399,20 @@ def main() -> int:
     if not files:
         raise SystemExit(f"no markdown files found in handbook dir: {handbook_dir}")
 
-    entries = [parse_handbook_file(f) for f in files]
-    target_files = list_text_files(target_dir, args.max_file_bytes)
+    docs = load_documents(list_text_files(target_dir, args.max_file_bytes))
 
+    # Parse and score each standard in one pass; scored is the only list of
+    # entries kept, and the target file contents are released once scoring ends.
     scored: List[Tuple[StandardEntry, int, List[str], int]] = []
-    for e in entries:
-        score, matched_files, total_hits = score_entry(e, target_files)
+    for f in files:
+        e = parse_handbook_file(f)
+        score, matched_files, total_hits = score_entry(e, docs)
         scored.append((e, score, matched_files, total_hits))
+    del docs
     scored.sort(key=lambda x: x[1], reverse=True)
 
     commit = git_rev(handbook_dir.parent if (handbook_dir / ".git").exists() else handbook_dir)
-    md = render_markdown(entries, scored, handbook_dir, target_dir, commit)
+    md = render_markdown(scored, handbook_dir, target_dir, commit)
 
     out_md.parent.mkdir(parents=True, exist_ok=True)
     out_md.write_text(md, encoding="utf-8")
@@ -274,7 +424,11 @@ def main() -> int:
         "handbook_commit": commit,
         "entries": [
             {
-                **asdict(e),
+                "key": e.key,
+                "title": e.title,
+                "path": e.path,
+                "heuristics": [{"cls": h.cls, "text": h.text} for h in e.heuristics],
+                "patterns": e.patterns,
                 "score": score,
                 "matched_files": matched_files,
                 "total_pattern_hits": total_hits,
@@ -283,7 +437,8 @@ def main() -> int:
         ],
     }
     out_json.parent.mkdir(parents=True, exist_ok=True)
-    out_json.write_text(json.dumps(json_blob, indent=2), encoding="utf-8")
+    with out_json.open("w", encoding="utf-8") as fh:
+        json.dump(json_blob, fh, indent=2)
 
     print(f"wrote: {out_md}")
     print(f"wrote: {out_json}")
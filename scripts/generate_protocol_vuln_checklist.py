@@ -3,13 +3,15 @@
 import argparse
 import json
 import math
+import os
 import re
 import subprocess
-from collections import Counter, defaultdict
-from dataclasses import asdict, dataclass
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
 from datetime import datetime, timezone
 from pathlib import Path
-from typing import Dict, List, Set, Tuple
+from typing import Dict, FrozenSet, Iterable, List, Optional, Set, Tuple
 
 
 TEXT_SUFFIXES = {
@@ -20,6 +22,19 @@ TEXT_SUFFIXES = {
     ".move",
 }
 
+# Below this many target files build_token_index tokenizes in-process.
+PARALLEL_MIN_FILES = 64
+
+# Identifier-like tokens of the (lowercased) target sources.
+TOKEN_RE = re.compile(rb"[a-z_][a-z0-9_]{2,}")
+# Words of category titles, slugs and code spans, matched after lowercasing.
+WORD_RE = re.compile(r"[a-z0-9_]+")
+
+# Category file markup.
+PROTOCOL_TYPE_RE = re.compile(r"^>\s*Protocol Type:\s*([^|]+)\|")
+NUMBERED_ITEM_RE = re.compile(r"^\d+\.\s+(.*)$")
+BACKTICK_RE = re.compile(r"`([^`]+)`")
+
 IGNORED_DIR_NAMES = {
     ".git",
     ".hg",
@@ -208,6 +223,14 @@ TOKEN_EXPANSIONS: Dict[str, List[str]] = {
     "mint": ["mint", "burn", "totalsupply", "supply"],
 }
 
+# TOKEN_EXPANSIONS with low-signal synonyms already dropped, and the tokens
+# expand_tokens discards outright.
+EXPANDED_TOKENS: Dict[str, Tuple[str, ...]] = {
+    token: tuple(item for item in items if item not in LOW_SIGNAL_TOKENS)
+    for token, items in TOKEN_EXPANSIONS.items()
+}
+SKIPPED_TOKENS = frozenset(STOPWORDS | LOW_SIGNAL_TOKENS)
+
 ALWAYS_KEEP = {
     "reentrancy",
     "oracle",
@@ -243,7 +266,30 @@ class CategoryEntry:
     keywords: List[str]
 
 
+def read_git_head(path: Path) -> str:
+    # Resolve HEAD from path/.git without spawning git; "" if it can't.
+    git_dir = path / ".git"
+    try:
+        head = (git_dir / "HEAD").read_text(encoding="utf-8").strip()
+        if not head.startswith("ref: "):
+            return head
+        ref = head[len("ref: "):]
+        ref_file = git_dir / ref
+        if ref_file.is_file():
+            return ref_file.read_text(encoding="utf-8").strip()
+        for line in (git_dir / "packed-refs").read_text(encoding="utf-8").splitlines():
+            sha, _, name = line.partition(" ")
+            if name == ref:
+                return sha
+    except OSError:
+        pass
+    return ""
+
+
 def git_rev(path: Path) -> str:
+    sha = read_git_head(path)
+    if sha:
+        return sha[:7]
     try:
         out = subprocess.check_output(
             ["git", "-C", str(path), "rev-parse", "--short", "HEAD"],
@@ -255,12 +301,8 @@ def git_rev(path: Path) -> str:
         return "unknown"
 
 
-def normalize_token(token: str) -> str:
-    return re.sub(r"[^a-z0-9_]", "", token.lower())
-
-
 def to_tokens(text: str) -> List[str]:
-    return [normalize_token(x) for x in re.findall(r"[a-zA-Z0-9_]+", text.lower()) if normalize_token(x)]
+    return WORD_RE.findall(text.lower())
 
 
 def de_dupe(items: List[str], limit: int = 32) -> List[str]:
@@ -279,15 +321,15 @@ def de_dupe(items: List[str], limit: int = 32) -> List[str]:
 def expand_tokens(tokens: List[str]) -> List[str]:
     expanded: List[str] = []
     for token in tokens:
-        if len(token) < 3 or token in STOPWORDS or token in LOW_SIGNAL_TOKENS:
+        if len(token) < 3 or token in SKIPPED_TOKENS:
             continue
-        if token in TOKEN_EXPANSIONS:
-            for item in TOKEN_EXPANSIONS[token]:
-                if item not in LOW_SIGNAL_TOKENS:
-                    expanded.append(item)
-        else:
+        expansion = EXPANDED_TOKENS.get(token)
+        if expansion is None:
             expanded.append(token)
-    return de_dupe(expanded, limit=40)
+        else:
+            expanded.extend(expansion)
+    # dict.fromkeys dedupes in insertion order; tokens are never empty here.
+    return list(dict.fromkeys(expanded))[:40]
 
 
 def parse_category_file(path: Path) -> CategoryEntry:
@@ -297,38 +339,40 @@ def parse_category_file(path: Path) -> CategoryEntry:
     detection_heuristics: List[str] = []
     section = ""
 
+    # Cheap prefix tests pick the branch; a regex only runs on lines that can match it.
     lines = path.read_text(encoding="utf-8", errors="ignore").splitlines()
     for line in lines:
         if line.startswith("# "):
             title = line.replace("# ", "").strip()
             continue
 
-        m = re.match(r"^>\s*Protocol Type:\s*([^|]+)\|", line)
-        if m:
-            protocol_type = m.group(1).strip().lower()
+        if line.startswith(">"):
+            m = PROTOCOL_TYPE_RE.match(line)
+            if m:
+                protocol_type = m.group(1).strip().lower()
             continue
 
         if line.startswith("## "):
             section = line.replace("## ", "").strip().lower()
             continue
 
-        if section == "preconditions" and line.startswith("- "):
-            preconditions.append(line[2:].strip())
-            continue
-
-        if section == "detection heuristics":
-            numbered = re.match(r"^\d+\.\s+(.*)$", line)
-            if numbered:
-                detection_heuristics.append(numbered.group(1).strip())
-            elif line.startswith("- "):
+        if section == "preconditions":
+            if line.startswith("- "):
+                preconditions.append(line[2:].strip())
+        elif section == "detection heuristics":
+            if line.startswith("- "):
                 detection_heuristics.append(line[2:].strip())
+            elif line[:1].isdigit():
+                numbered = NUMBERED_ITEM_RE.match(line)
+                if numbered:
+                    detection_heuristics.append(numbered.group(1).strip())
 
     slug_tokens = to_tokens(path.stem)
     title_tokens = to_tokens(title)
     protocol_tokens = to_tokens(protocol_type)
     code_tokens: List[str] = []
     heuristic_text = " ".join(detection_heuristics[:6])
-    for backtick_item in re.findall(r"`([^`]+)`", heuristic_text):
+    for backtick_item in BACKTICK_RE.findall(heuristic_text):
         code_tokens.extend(to_tokens(backtick_item))
 
     keywords = expand_tokens(slug_tokens + title_tokens + protocol_tokens + code_tokens)
@@ -346,49 +390,120 @@ def parse_category_file(path: Path) -> CategoryEntry:
 
 def list_text_files(target_dir: Path, max_file_bytes: int) -> List[Path]:
     files: List[Path] = []
-    for p in target_dir.rglob("*"):
-        if not p.is_file():
-            continue
-        if any(part in IGNORED_DIR_NAMES for part in p.parts):
-            continue
-        if p.suffix.lower() not in TEXT_SUFFIXES:
-            continue
-        try:
-            if p.stat().st_size > max_file_bytes:
-                continue
-        except Exception:
-            continue
-        files.append(p)
+    _collect_text_files(str(target_dir), max_file_bytes, files)
     return files
 
 
-def build_token_index(files: List[Path]) -> Tuple[Dict[str, Set[int]], Counter]:
-    token_to_files: Dict[str, Set[int]] = defaultdict(set)
-    global_counts: Counter = Counter()
-
-    for idx, fp in enumerate(files):
-        try:
-            text = fp.read_text(encoding="utf-8", errors="ignore").lower()
-        except Exception:
-            continue
+def _collect_text_files(directory: str, max_file_bytes: int, files: List[Path]) -> None:
+    # Ignored directories are pruned without being entered, and the size check
+    # uses the DirEntry instead of a second stat of a Path. Files of a directory
+    # are listed before its subdirectories, the order rglob produced.
+    subdirs: List[str] = []
+    try:
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    if entry.name not in IGNORED_DIR_NAMES:
+                        subdirs.append(entry.path)
+                    continue
+                suffix = os.path.splitext(entry.name)[1].lower()
+                if suffix not in TEXT_SUFFIXES:
+                    continue
+                try:
+                    if not entry.is_file() or entry.stat().st_size > max_file_bytes:
+                        continue
+                except OSError:
+                    continue
+                files.append(Path(entry.path))
+    except OSError:
+        return
+    for subdir in subdirs:
+        _collect_text_files(subdir, max_file_bytes, files)
+
+
+# Decoded token strings shared by every file this process tokenizes, so each
+# distinct token is decoded and stored as a str only once.
+_TOKEN_NAMES: Dict[bytes, str] = {}
+
+
+def count_file_tokens(fp: Path) -> Dict[str, int]:
+    # Tokens are pure ASCII, so scan the raw bytes (bytes.lower only folds
+    # ASCII) and decode just the distinct tokens instead of the whole file.
+    try:
+        data = fp.read_bytes().lower()
+    except Exception:
+        return {}
+
+    # Counter consumes the findall list in C; feeding it match objects from
+    # finditer costs a Python-level .group() call per token.
+    per_file = Counter(TOKEN_RE.findall(data))
+    names: List[str] = []
+    for token in per_file:
+        name = _TOKEN_NAMES.get(token)
+        if name is None:
+            name = _TOKEN_NAMES[token] = token.decode("ascii")
+        names.append(name)
+    return dict(zip(names, per_file.values()))
+
+
+def build_token_index(files: List[Path], jobs: Optional[int] = None) -> Tuple[Dict[str, List[int]], Dict[str, int]]:
+    # Posting lists come out sorted and duplicate-free because files are
+    # merged in index order and each file contributes a token once.
+    token_to_files: Dict[str, List[int]] = {}
+    global_counts: Dict[str, int] = {}
+
+    # Tokenizing is CPU-bound, so large trees are spread over worker processes;
+    # small ones aren't worth the pool start-up.
+    if len(files) > PARALLEL_MIN_FILES and jobs != 1:
+        executor = ProcessPoolExecutor(max_workers=jobs)
+        results = executor.map(count_file_tokens, files, chunksize=16)
+    else:
+        executor = None
+        results = map(count_file_tokens, files)
 
-        file_tokens = re.findall(r"[a-z_][a-z0-9_]{2,}", text)
-        if not file_tokens:
-            continue
-        per_file = Counter(file_tokens)
-        for token in per_file:
-            token_to_files[token].add(idx)
-        global_counts.update(per_file)
+    try:
+        # Postings and global counts are filled in the same pass; a token has
+        # both entries or neither, so one lookup tells which case applies.
+        for idx, per_file in enumerate(results):
+            for token, count in per_file.items():
+                postings = token_to_files.get(token)
+                if postings is None:
+                    token_to_files[token] = [idx]
+                    global_counts[token] = count
+                else:
+                    postings.append(idx)
+                    global_counts[token] += count
+    finally:
+        if executor is not None:
+            executor.shutdown()
 
     return token_to_files, global_counts
 
 
+def find_common_tokens(
+    keywords: Iterable[str],
+    token_to_files: Dict[str, List[int]],
+    total_files: int,
+    common_token_ratio: float,
+) -> FrozenSet[str]:
+    # Keywords present in too many files to carry signal; ALWAYS_KEEP is exempt.
+    common: Set[str] = set()
+    for kw in keywords:
+        ids = token_to_files.get(kw)
+        if not ids or kw in ALWAYS_KEEP:
+            continue
+        if len(ids) / max(total_files, 1) > common_token_ratio:
+            common.add(kw)
+    return frozenset(common)
+
+
 def score_entry(
     entry: CategoryEntry,
-    token_to_files: Dict[str, Set[int]],
-    global_counts: Counter,
+    token_to_files: Dict[str, List[int]],
+    global_counts: Dict[str, int],
     total_files: int,
-    common_token_ratio: float,
+    common_tokens: FrozenSet[str],
+    idf_cache: Dict[str, float],
 ) -> Tuple[int, List[int], List[str], int]:
     matched_file_ids: Set[int] = set()
     matched_keywords: List[str] = []
@@ -396,15 +511,16 @@ def score_entry(
 
     for kw in entry.keywords:
         ids = token_to_files.get(kw)
-        if not ids:
-            continue
-        coverage = len(ids) / max(total_files, 1)
-        if coverage > common_token_ratio and kw not in ALWAYS_KEEP:
+        if not ids or kw in common_tokens:
             continue
         matched_keywords.append(kw)
         matched_file_ids.update(ids)
-        idf = math.log1p(max(total_files, 1) / (1 + len(ids)))
-        weighted_signal += min(3.5, idf)
+        # A keyword's IDF depends only on its document frequency, so it is
+        # computed once and shared by every category that uses it.
+        signal = idf_cache.get(kw)
+        if signal is None:
+            signal = idf_cache[kw] = min(3.5, math.log1p(max(total_files, 1) / (1 + len(ids))))
+        weighted_signal += signal
 
     total_hits = sum(min(global_counts.get(kw, 0), 500) for kw in matched_keywords)
     score = min(len(matched_file_ids), 500) + int(weighted_signal * 20) + min(len(entry.detection_heuristics), 8)
@@ -433,10 +549,11 @@ def render_markdown(
         "|---|---|---:|---:|---:|",
     ]
 
-    for entry, score, matched_files, _, _ in scored[:120]:
-        lines.append(
-            f"| `{entry.key}` | `{entry.protocol_type}` | {score} | {len(matched_files)} | {len(entry.detection_heuristics)} |"
-        )
+    lines.extend(
+        "| `%s` | `%s` | %d | %d | %d |"
+        % (entry.key, entry.protocol_type, score, len(matched_files), len(entry.detection_heuristics))
+        for entry, score, matched_files, _, _ in scored[:120]
+    )
 
     lines.extend(["", "## Actionable Checks", ""])
     relevant = [x for x in scored if x[1] > 0][:max_entries]
@@ -444,29 +561,29 @@ def render_markdown(
         relevant = scored[:max_entries]
 
     for entry, score, matched_files, matched_keywords, total_hits in relevant:
-        lines.append(f"### {entry.title} (`{entry.key}`)")
-        lines.append("")
-        lines.append(f"- relevance_score: {score}")
-        lines.append(f"- protocol_type: `{entry.protocol_type}`")
-        lines.append(f"- matched_files: {len(matched_files)}")
-        lines.append(f"- total_signal_hits: {total_hits}")
-        lines.append(f"- source: `{entry.path}`")
+        lines.extend(
+            [
+                f"### {entry.title} (`{entry.key}`)",
+                "",
+                f"- relevance_score: {score}",
+                f"- protocol_type: `{entry.protocol_type}`",
+                f"- matched_files: {len(matched_files)}",
+                f"- total_signal_hits: {total_hits}",
+                f"- source: `{entry.path}`",
+            ]
+        )
         if matched_keywords:
             lines.append(f"- matched_keywords: `{', '.join(matched_keywords)}`")
         if matched_files:
             lines.append("- sample_matches:")
-            for p in matched_files[:8]:
-                lines.append(f"  - `{p}`")
+            lines.extend("  - `%s`" % p for p in matched_files[:8])
         if entry.preconditions:
             lines.append("- preconditions:")
-            for item in entry.preconditions[:6]:
-                lines.append(f"  - {item}")
+            lines.extend("  - " + item for item in entry.preconditions[:6])
+        lines.append("- checklist:")
         if entry.detection_heuristics:
-            lines.append("- checklist:")
-            for h in entry.detection_heuristics[:10]:
-                lines.append(f"  - {h}")
+            lines.extend("  - " + h for h in entry.detection_heuristics[:10])
         else:
-            lines.append("- checklist:")
             lines.append("  - No detection heuristics were parsed from this entry.")
         lines.append("")
 
@@ -484,6 +601,14 @@ def render_markdown(
     return "\n".join(lines)
 
 
+def positive_int(value: str) -> int:
+    """argparse type for counts that must be at least 1."""
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {number}")
+    return number
+
+
 def main() -> int:
     parser = argparse.ArgumentParser(description="Generate protocol vulnerability checklist from protocol-vulnerabilities-index.")
     parser.add_argument("--target-dir", required=True, help="Target codebase directory")
@@ -503,6 +628,7 @@ def main() -> int:
         help="JSON output path",
     )
     parser.add_argument("--max-file-bytes", type=int, default=700_000, help="Skip files larger than this size")
+    parser.add_argument("--jobs", type=positive_int, default=None, help="Tokenizer worker processes (default: CPU count)")
     parser.add_argument("--max-entries", type=int, default=80, help="Max actionable entries in markdown output")
     parser.add_argument(
         "--common-token-ratio",
@@ -529,18 +655,29 @@ def main() -> int:
 
     entries = [parse_category_file(p) for p in category_files]
     files = list_text_files(target_dir, max_file_bytes=args.max_file_bytes)
-    token_to_files, global_counts = build_token_index(files)
+    token_to_files, global_counts = build_token_index(files, jobs=args.jobs)
 
     scored: List[Tuple[CategoryEntry, int, List[str], List[str], int]] = []
+    # One shared string per target file; ids come from enumerate(files), so
+    # they always index it.
+    file_paths = [str(fp) for fp in files]
+    idf_cache: Dict[str, float] = {}
+    common_tokens = find_common_tokens(
+        {kw for entry in entries for kw in entry.keywords},
+        token_to_files,
+        len(files),
+        args.common_token_ratio,
+    )
     for entry in entries:
         score, file_ids, matched_keywords, total_hits = score_entry(
             entry=entry,
             token_to_files=token_to_files,
             global_counts=global_counts,
             total_files=len(files),
-            common_token_ratio=args.common_token_ratio,
+            common_tokens=common_tokens,
+            idf_cache=idf_cache,
         )
-        matched_paths = [str(files[i]) for i in file_ids if 0 <= i < len(files)]
+        matched_paths = [file_paths[i] for i in file_ids]
         scored.append((entry, score, matched_paths, matched_keywords, total_hits))
 
     scored.sort(key=lambda x: (x[1], len(x[0].detection_heuristics)), reverse=True)
@@ -564,7 +701,13 @@ def main() -> int:
         "index_commit": commit,
         "entries": [
             {
-                **asdict(entry),
+                "key": entry.key,
+                "title": entry.title,
+                "protocol_type": entry.protocol_type,
+                "path": entry.path,
+                "preconditions": entry.preconditions,
+                "detection_heuristics": entry.detection_heuristics,
+                "keywords": entry.keywords,
                 "score": score,
                 "matched_files": matched_files,
                 "matched_keywords": matched_keywords,
@@ -574,7 +717,8 @@ def main() -> int:
         ],
     }
     json_output.parent.mkdir(parents=True, exist_ok=True)
-    json_output.write_text(json.dumps(payload, indent=2), encoding="utf-8")
+    with json_output.open("w", encoding="utf-8") as fh:
+        json.dump(payload, fh, indent=2)
     print(f"wrote: {json_output}")
     return 0
 
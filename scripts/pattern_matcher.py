@@ -9,24 +9,40 @@ Usage:
 
 import sys
 import re
-from typing import List, Dict, Optional, Tuple
-from dataclasses import dataclass
+from typing import List, Dict, FrozenSet, Optional, Tuple
+from collections import Counter
+from dataclasses import dataclass, field
 from pathlib import Path
 
 # Add parent directory to path for imports
 sys.path.insert(0, str(Path(__file__).parent))
 
-from solodit_client import get_client, SoloditFinding, SearchResult
+from solodit_client import DEFAULT_CACHE_PATH, get_client, SoloditFinding, SearchResult
 
 
 @dataclass
 class PatternMatch:
     """Represents a matched pattern with relevance score"""
+    __slots__ = ("finding", "relevance_score", "match_reasons")
+    
     finding: SoloditFinding
     relevance_score: float  # 0.0 - 1.0
     match_reasons: List[str]
 
 
+@dataclass
+class MatchStats:
+    """Report statistics aggregated over a list of matches"""
+    count: int
+    max_quality: float
+    max_finders: int
+    severity_total: int = 0
+    quality_total: float = 0.0
+    tag_counts: Counter = field(default_factory=Counter)
+    protocol_counts: Counter = field(default_factory=Counter)
+    impact_counts: Counter = field(default_factory=Counter)
+
+
 class PatternMatcher:
     """
     Intelligent pattern matcher that finds similar vulnerabilities.
@@ -112,8 +128,40 @@ class PatternMatcher:
         }
     }
     
-    def __init__(self):
-        self.client = get_client()
+    # Expected severity -> Solodit impact filter
+    IMPACT_FILTERS = {
+        "CRITICAL": ["HIGH"],
+        "HIGH": ["HIGH"],
+        "MEDIUM": ["MEDIUM"],
+        "LOW": ["LOW"],
+        "GAS": ["GAS"]
+    }
+    
+    # Rounded average severity_int -> label
+    SEVERITY_LABELS = {3: "HIGH", 2: "MEDIUM", 1: "LOW", 0: "GAS/INFO"}
+    
+    # Per pattern: its (keyword, lowercased keyword) pairs and its tags, built
+    # once so keyword scans don't walk the nested dicts or re-lowercase
+    KEYWORD_GROUPS = tuple(
+        (tuple((k, k.lower()) for k in data["keywords"]), tuple(data["tags"]))
+        for data in VULNERABILITY_PATTERNS.values()
+    )
+    
+    # Solidity/function patterns also taken as keywords (compiled once)
+    SOLIDITY_PATTERNS = tuple(re.compile(p) for p in (
+        r"function\s+(\w+)",
+        r"\.call{value:",
+        r"delegatecall",
+        r"transfer\(",
+        r"require\(",
+    ))
+    
+    # Cached search results older than this are fetched again
+    SEARCH_CACHE_TTL = 24 * 3600
+    
+    def __init__(self, cache_path: Optional[str] = None):
+        # The client persists its response cache to cache_path, if given
+        self.client = get_client(cache_ttl=self.SEARCH_CACHE_TTL, cache_path=cache_path)
     
     def find_similar_vulnerabilities(
         self,
@@ -145,14 +193,7 @@ class PatternMatcher:
         # Map severity
         impact_filter = None
         if severity:
-            impact_map = {
-                "CRITICAL": ["HIGH"],
-                "HIGH": ["HIGH"],
-                "MEDIUM": ["MEDIUM"],
-                "LOW": ["LOW"],
-                "GAS": ["GAS"]
-            }
-            impact_filter = impact_map.get(severity.upper())
+            impact_filter = self.IMPACT_FILTERS.get(severity.upper())
         
         # Build search query
         search_keywords = " ".join(keywords[:3]) if keywords else None
@@ -173,10 +214,13 @@ class PatternMatcher:
             return []
         
         # Score and rank matches
+        keyword_pairs = [(k, k.lower()) for k in keywords]
+        query_tags_lower = frozenset(t.lower() for t in inferred_tags)
         matches = []
         for finding in results.findings:
             score, reasons = self._calculate_relevance(
-                finding, vulnerability_description, code_snippet, inferred_tags
+                finding, vulnerability_description, code_snippet,
+                inferred_tags, query_tags_lower, keyword_pairs
             )
             if score >= min_similarity:
                 matches.append(PatternMatch(
@@ -198,10 +242,10 @@ class PatternMatcher:
         text = (description + " " + (code_snippet or "")).lower()
         tags = []
         
-        for vuln_type, data in self.VULNERABILITY_PATTERNS.items():
-            for keyword in data["keywords"]:
-                if keyword.lower() in text:
-                    tags.extend(data["tags"])
+        for keywords, pattern_tags in self.KEYWORD_GROUPS:
+            for keyword, keyword_lower in keywords:
+                if keyword_lower in text:
+                    tags.extend(pattern_tags)
                     break
         
         # Remove duplicates while preserving order
@@ -220,23 +264,14 @@ class PatternMatcher:
         keywords = []
         
         # Collect all matching keywords from patterns
-        for vuln_type, data in self.VULNERABILITY_PATTERNS.items():
-            for keyword in data["keywords"]:
-                if keyword.lower() in text_lower:
+        for pattern_keywords, _ in self.KEYWORD_GROUPS:
+            for keyword, keyword_lower in pattern_keywords:
+                if keyword_lower in text_lower:
                     keywords.append(keyword)
         
         # Add specific Solidity/function patterns
-        solidity_patterns = [
-            r"function\s+(\w+)",
-            r"\.call{value:",
-            r"delegatecall",
-            r"transfer\(",
-            r"require\(",
-        ]
-        
-        for pattern in solidity_patterns:
-            matches = re.findall(pattern, text)
-            keywords.extend(matches)
+        for pattern in self.SOLIDITY_PATTERNS:
+            keywords.extend(pattern.findall(text))
         
         # Remove duplicates
         return list(dict.fromkeys(keywords))
@@ -246,7 +281,9 @@ class PatternMatcher:
         finding: SoloditFinding,
         description: str,
         code_snippet: Optional[str],
-        query_tags: List[str]
+        query_tags: List[str],
+        query_tags_lower: FrozenSet[str],
+        query_keywords: List[Tuple[str, str]]
     ) -> Tuple[float, List[str]]:
         """Calculate relevance score between finding and query"""
         score = 0.0
@@ -256,8 +293,7 @@ class PatternMatcher:
         content_lower = finding.content.lower()
         
         # 1. Keyword overlap (max 0.35)
-        query_keywords = self._extract_keywords(description)
-        matching_keywords = [k for k in query_keywords if k.lower() in content_lower]
+        matching_keywords = [k for k, k_lower in query_keywords if k_lower in content_lower]
         if matching_keywords and query_keywords:
             keyword_score = len(matching_keywords) / len(query_keywords) * 0.35
             score += keyword_score
@@ -266,7 +302,7 @@ class PatternMatcher:
         
         # 2. Tag overlap (max 0.30)
         if query_tags and finding.tags:
-            matching_tags = set(t.lower() for t in query_tags) & set(t.lower() for t in finding.tags)
+            matching_tags = query_tags_lower & set(finding.tags_lower)
             if matching_tags:
                 tag_score = len(matching_tags) / len(query_tags) * 0.30
                 score += tag_score
@@ -308,23 +344,26 @@ may need refinement to match known vulnerability types.
 6-step verification harness.
 """
         
-        report = f"""## Pattern Matching Report: {hypothesis_id}
+        stats = self._aggregate(matches)
+        avg_severity = self._severity_label(stats.severity_total / stats.count)
+        
+        parts = [f"""## Pattern Matching Report: {hypothesis_id}
 
 **Status**: ✅ {len(matches)} similar historical finding(s) identified
 
 ### Summary Statistics
-- **Average Historical Severity**: {self._avg_severity(matches)}
-- **Average Quality Score**: {self._avg_quality(matches):.1f}/5
-- **Common Tags**: {self._common_patterns(matches)}
-- **Most Affected Protocol Type**: {self._common_protocol_type(matches)}
+- **Average Historical Severity**: {avg_severity}
+- **Average Quality Score**: {stats.quality_total / stats.count:.1f}/5
+- **Common Tags**: {self._common_patterns(stats)}
+- **Most Affected Protocol Type**: {self._common_protocol_type(stats)}
 
 ### Top Historical Matches
 
-"""
+"""]
         
         for i, match in enumerate(matches[:5], 1):
             f = match.finding
-            report += f"""
+            parts.append(f"""
 #### {i}. [{f.impact}] {f.title}
 
 **Relevance Score**: {match.relevance_score:.0%}
@@ -341,24 +380,24 @@ may need refinement to match known vulnerability types.
 **🔗 Source**: {f.source_link or "N/A"}
 
 ---
-"""
+""")
         
         if include_details:
-            report += f"""
+            parts.append(f"""
 ### Historical Impact Analysis
 
 Based on {len(matches)} similar findings:
 
 | Metric | Value |
 |--------|-------|
-| Average Severity | {self._avg_severity(matches)} |
-| Most Common Impact | {self._most_common_impact(matches)} |
-| Highest Quality Finding | {max(matches, key=lambda m: m.finding.quality_score).finding.quality_score:.1f}/5 |
-| Most Finders (Popularity) | {max(matches, key=lambda m: m.finding.finders_count).finding.finders_count} |
+| Average Severity | {avg_severity} |
+| Most Common Impact | {self._most_common_impact(stats)} |
+| Highest Quality Finding | {stats.max_quality:.1f}/5 |
+| Most Finders (Popularity) | {stats.max_finders} |
 
 ### Common Vulnerability Patterns
 
-{self._pattern_analysis(matches)}
+{self._pattern_analysis(stats)}
 
 ### Recommended Verification Steps
 
@@ -372,72 +411,61 @@ Based on historical findings of this type:
 2. ✅ **Adapt to target**: Apply historical patterns to current codebase
 3. ✅ **Verification harness**: Proceed with full 6-step verification
 4. ✅ **Impact assessment**: Use historical losses as reference
-"""
+""")
         
-        return report
+        return "".join(parts)
+    
+    def _aggregate(self, matches: List[PatternMatch]) -> MatchStats:
+        """Collect every report statistic in a single pass over matches"""
+        first = matches[0].finding
+        stats = MatchStats(
+            count=len(matches),
+            max_quality=first.quality_score,
+            max_finders=first.finders_count
+        )
+        for m in matches:
+            f = m.finding
+            stats.severity_total += f.severity_int
+            stats.quality_total += f.quality_score
+            stats.max_quality = max(stats.max_quality, f.quality_score)
+            stats.max_finders = max(stats.max_finders, f.finders_count)
+            stats.tag_counts.update(f.tags)
+            if f.protocol_name:
+                stats.protocol_counts[f.protocol_name] += 1
+            stats.impact_counts[f.impact] += 1
+        return stats
+    
+    def _severity_label(self, avg: float) -> str:
+        """Map an average numeric severity back to its label"""
+        return self.SEVERITY_LABELS.get(round(avg), "UNKNOWN")
     
     def _avg_severity(self, matches: List[PatternMatch]) -> str:
         """Calculate average severity from matches"""
         if not matches:
             return "N/A"
         severities = [m.finding.severity_int for m in matches]
-        avg = sum(severities) / len(severities)
-        mapping = {3: "HIGH", 2: "MEDIUM", 1: "LOW", 0: "GAS/INFO"}
-        return mapping.get(round(avg), "UNKNOWN")
+        return self._severity_label(sum(severities) / len(severities))
     
-    def _avg_quality(self, matches: List[PatternMatch]) -> float:
-        """Calculate average quality score"""
-        if not matches:
-            return 0.0
-        return sum(m.finding.quality_score for m in matches) / len(matches)
-    
-    def _common_patterns(self, matches: List[PatternMatch]) -> str:
+    def _common_patterns(self, stats: MatchStats) -> str:
         """Extract common patterns from matches"""
-        if not matches:
-            return "N/A"
-        from collections import Counter
-        all_tags = []
-        for m in matches:
-            all_tags.extend(m.finding.tags)
-        common = Counter(all_tags).most_common(3)
+        common = stats.tag_counts.most_common(3)
         return ', '.join([tag for tag, _ in common]) if common else "N/A"
     
-    def _common_protocol_type(self, matches: List[PatternMatch]) -> str:
+    def _common_protocol_type(self, stats: MatchStats) -> str:
         """Get most common protocol type"""
-        if not matches:
-            return "N/A"
-        from collections import Counter
-        protocols = [m.finding.protocol_name for m in matches if m.finding.protocol_name]
-        if not protocols:
-            return "N/A"
-        common = Counter(protocols).most_common(1)
+        common = stats.protocol_counts.most_common(1)
         return common[0][0] if common else "N/A"
     
-    def _most_common_impact(self, matches: List[PatternMatch]) -> str:
+    def _most_common_impact(self, stats: MatchStats) -> str:
         """Get most common impact level"""
-        if not matches:
-            return "N/A"
-        from collections import Counter
-        impacts = [m.finding.impact for m in matches]
-        common = Counter(impacts).most_common(1)
+        common = stats.impact_counts.most_common(1)
         return common[0][0] if common else "N/A"
     
-    def _pattern_analysis(self, matches: List[PatternMatch]) -> str:
+    def _pattern_analysis(self, stats: MatchStats) -> str:
         """Analyze patterns across matches"""
-        if not matches:
-            return "No patterns identified."
-        
-        # Collect all tags
-        all_tags = []
-        for m in matches:
-            all_tags.extend(m.finding.tags)
-        
-        from collections import Counter
-        tag_counts = Counter(all_tags)
-        
         analysis = []
-        for tag, count in tag_counts.most_common(5):
-            percentage = count / len(matches) * 100
+        for tag, count in stats.tag_counts.most_common(5):
+            percentage = count / stats.count * 100
             analysis.append(f"- **{tag}**: Found in {percentage:.0f}% of similar issues")
         
         return '\n'.join(analysis) if analysis else "No specific patterns identified."
@@ -447,7 +475,7 @@ Based on historical findings of this type:
         checks = set()
         
         for m in matches:
-            tags_lower = [t.lower() for t in m.finding.tags]
+            tags_lower = m.finding.tags_lower
             
             if any("reentrancy" in t for t in tags_lower):
                 checks.add("1. ✅ Verify CEI pattern (Checks-Effects-Interactions)")
@@ -520,11 +548,26 @@ Examples:
         metavar="FILE",
         help="Save report to file"
     )
+    parser.add_argument(
+        "--cache",
+        metavar="FILE",
+        default=DEFAULT_CACHE_PATH,
+        help=f"Shelve file for caching Solodit searches (default: {DEFAULT_CACHE_PATH})"
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Always query the Solodit API"
+    )
     
     args = parser.parse_args()
     
     try:
-        matcher = PatternMatcher()
+        cache_path = None
+        if not args.no_cache:
+            cache_path = args.cache
+            Path(cache_path).parent.mkdir(parents=True, exist_ok=True)
+        matcher = PatternMatcher(cache_path=cache_path)
         
         print(f"🔍 Searching for vulnerabilities similar to:")
         print(f"   '{args.description}'")
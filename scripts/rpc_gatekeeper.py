@@ -8,9 +8,13 @@ and forwards allowed requests to an upstream RPC endpoint.
 
 import argparse
 import json
-import urllib.request
+import re
+from functools import lru_cache
 from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 
+import requests
+from requests.adapters import HTTPAdapter
+
 
 DEFAULT_DENY_PREFIXES = (
     "anvil_",
@@ -21,24 +25,46 @@ DEFAULT_DENY_PREFIXES = (
     "personal_",
 )
 
-DEFAULT_DENY_EXACT = {
+DEFAULT_DENY_EXACT = frozenset({
     "evm_setNextBlockTimestamp",
     "evm_setTime",
     "evm_mine",
     "evm_increaseTime",
     "eth_sendUnsignedTransaction",
-}
+})
+
+# All deny prefixes tested in one match; the group is the prefix that hit.
+DENY_PREFIX_RE = re.compile("(" + "|".join(map(re.escape, DEFAULT_DENY_PREFIXES)) + ")")
+
+# A relayed body must at least open a JSON object or array.
+JSON_BODY_START_RE = re.compile(rb"[ \t\n\r]*[\[{]")
+
+# Compact separators; one encoder reused instead of one per json.dumps call.
+_JSON_ENCODER = json.JSONEncoder(separators=(",", ":"))
+
+# Upstream connections kept alive and shared by all handler threads.
+MAX_POOL_CONNECTIONS = 32
+_SESSION = requests.Session()
+_SESSION.mount("http://", HTTPAdapter(pool_maxsize=MAX_POOL_CONNECTIONS))
+_SESSION.mount("https://", HTTPAdapter(pool_maxsize=MAX_POOL_CONNECTIONS))
 
 
+# Clients reuse a small set of method names; the bound keeps arbitrary names
+# from growing the cache.
+@lru_cache(maxsize=512)
 def method_block_reason(method: str):
     if method in DEFAULT_DENY_EXACT:
         return f"method '{method}' is blocked"
-    for prefix in DEFAULT_DENY_PREFIXES:
-        if method.startswith(prefix):
-            return f"method '{method}' is blocked by prefix '{prefix}'"
+    m = DENY_PREFIX_RE.match(method)
+    if m:
+        return f"method '{method}' is blocked by prefix '{m.group(1)}'"
     return None
 
 
+def encode_json(data) -> bytes:
+    return _JSON_ENCODER.encode(data).encode("utf-8")
+
+
 def make_error(rpc_id, code, message):
     return {"jsonrpc": "2.0", "id": rpc_id, "error": {"code": code, "message": message}}
 
@@ -51,7 +77,7 @@ class Handler(BaseHTTPRequestHandler):
         body = self.rfile.read(length)
 
         try:
-            payload = json.loads(body.decode("utf-8"))
+            payload = json.loads(body)
         except Exception:
             self._send_json(make_error(None, -32700, "Invalid JSON"))
             return
@@ -71,19 +97,29 @@ class Handler(BaseHTTPRequestHandler):
         upstream_results = []
         if allowed:
             forward_payload = allowed if isinstance(payload, list) else allowed[0]
-            req = urllib.request.Request(
-                self.upstream,
-                data=json.dumps(forward_payload).encode("utf-8"),
-                headers={"Content-Type": "application/json"},
-                method="POST",
-            )
             try:
-                with urllib.request.urlopen(req, timeout=30) as resp:
-                    forwarded = json.loads(resp.read().decode("utf-8"))
+                resp = _SESSION.post(
+                    self.upstream,
+                    data=encode_json(forward_payload),
+                    headers={"Content-Type": "application/json"},
+                    timeout=30,
+                )
+                resp.raise_for_status()
+                raw = resp.content
+                if isinstance(payload, list):
+                    forwarded = json.loads(raw)
+                elif not JSON_BODY_START_RE.match(raw):
+                    raise ValueError("upstream response is not JSON")
             except Exception as exc:
                 self._send_json(make_error(None, -32001, f"upstream error: {exc}"))
                 return
 
+            # A single allowed call has nothing to merge with, so relay the
+            # upstream bytes without a decode/encode round trip.
+            if not isinstance(payload, list):
+                self._send_raw(raw)
+                return
+
             if isinstance(forwarded, list):
                 upstream_results.extend(forwarded)
             else:
@@ -102,7 +138,9 @@ class Handler(BaseHTTPRequestHandler):
         return
 
     def _send_json(self, data):
-        raw = json.dumps(data).encode("utf-8")
+        self._send_raw(encode_json(data))
+
+    def _send_raw(self, raw: bytes):
         self.send_response(200)
         self.send_header("Content-Type", "application/json")
         self.send_header("Content-Length", str(len(raw)))
@@ -16,12 +16,21 @@ Usage:
 
 import os
 import json
+import hashlib
+import random
+import shelve
+import sys
 import time
 import logging
-from typing import List, Dict, Optional, Literal, Any, Tuple
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import List, Dict, Hashable, Optional, Literal, Any, Tuple
 from dataclasses import dataclass, field
+from functools import cached_property
 from datetime import datetime, timedelta
 import requests
+from requests.adapters import HTTPAdapter
 from urllib.parse import urljoin
 
 # Configure logging
@@ -32,7 +41,46 @@ logger = logging.getLogger(__name__)
 SOLODIT_API_BASE = "https://solodit.cyfrin.io/api/v1/solodit"
 DEFAULT_TIMEOUT = 15
 MAX_RETRIES = 3
+BACKOFF_BASE = 0.5
+BACKOFF_CAP = 10.0
+MAX_RATE_LIMIT_WAIT = 60.0
 DEFAULT_CACHE_TTL = 300  # 5 minutes
+MAX_CACHE_ENTRIES = 1000
+MAX_POOL_CONNECTIONS = 16
+
+# Shelve file shared by every tool that persists Solodit responses
+DEFAULT_CACHE_PATH = os.path.join(os.path.expanduser("~"), ".cache", "ralph", "solodit")
+
+# Numeric severity per impact level (see SoloditFinding.severity_int)
+IMPACT_SEVERITY: Dict[str, int] = {"HIGH": 3, "MEDIUM": 2, "LOW": 1, "GAS": 0}
+
+# Common vulnerability names mapped to Solodit tags (see search_similar_findings)
+VULNERABILITY_TAGS: Dict[str, List[str]] = {
+    "reentrancy": ["Reentrancy", "CEI", "External Call"],
+    "access_control": ["Access Control", "Authentication", "Admin"],
+    "oracle": ["Oracle", "Price Manipulation", "TWAP"],
+    "flash_loan": ["Flash Loan", "Price Manipulation"],
+    "rounding": ["Rounding", "Precision", "Decimals"],
+    "overflow": ["Overflow", "Underflow", "SafeMath"],
+    "delegatecall": ["Delegatecall", "Proxy"],
+    "signature": ["Signature", "ECDSA", "EIP-712"],
+    "frontrunning": ["Frontrunning", "MEV", "Sandwich"],
+    "dos": ["DOS", "Gas Limit", "Denial-Of-Service"],
+    "timestamp": ["Timestamp", "block.timestamp"],
+    "randomness": ["Randomness", "Cryptography"],
+}
+
+# Cache keys are (endpoint, frozen request body)
+CacheKey = Tuple[str, Hashable]
+
+
+def _freeze(obj: Any) -> Hashable:
+    """Convert a JSON-like request body into a hashable, order-independent key"""
+    if isinstance(obj, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in obj.items()))
+    if isinstance(obj, list):
+        return tuple(_freeze(v) for v in obj)
+    return obj
 
 
 @dataclass
@@ -57,7 +105,12 @@ class SoloditFinding:
     @property
     def severity_int(self) -> int:
         """Convert impact to numeric severity for calculations"""
-        return {"HIGH": 3, "MEDIUM": 2, "LOW": 1, "GAS": 0}.get(self.impact, 0)
+        return IMPACT_SEVERITY.get(self.impact, 0)
+    
+    @cached_property
+    def tags_lower(self) -> Tuple[str, ...]:
+        """Lowercased tags, computed once per finding for tag matching"""
+        return tuple(t.lower() for t in self.tags)
     
     @property
     def severity_label(self) -> str:
@@ -84,6 +137,12 @@ class SoloditFinding:
 @dataclass
 class SearchResult:
     """Container for search results with metadata"""
+    __slots__ = (
+        "findings", "total_results", "current_page", "total_pages",
+        "query_time_ms", "rate_limit_remaining", "rate_limit_reset",
+        "_by_impact",
+    )
+    
     findings: List[SoloditFinding]
     total_results: int
     current_page: int
@@ -99,7 +158,14 @@ class SearchResult:
     
     def get_by_impact(self, impact: str) -> List[SoloditFinding]:
         """Filter findings by impact level"""
-        return [f for f in self.findings if f.impact == impact]
+        # Bucket findings once; repeated calls per severity tier reuse the index
+        by_impact = getattr(self, "_by_impact", None)
+        if by_impact is None:
+            by_impact = {}
+            for f in self.findings:
+                by_impact.setdefault(f.impact, []).append(f)
+            self._by_impact = by_impact
+        return list(by_impact.get(impact, ()))
 
 
 class SoloditAPIError(Exception):
@@ -120,13 +186,20 @@ class SoloditClient:
     Get your API key at: https://solodit.cyfrin.io/
     """
     
-    def __init__(self, api_key: Optional[str] = None, cache_ttl: int = DEFAULT_CACHE_TTL):
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        cache_ttl: int = DEFAULT_CACHE_TTL,
+        cache_path: Optional[str] = None
+    ):
         """
         Initialize the Solodit client.
         
         Args:
             api_key: Solodit API key (or set SOLODIT_API_KEY env var)
             cache_ttl: Cache time-to-live in seconds (default: 300)
+            cache_path: Optional shelve file that persists cached responses
+                across processes
         """
         self.api_key = api_key or os.environ.get("SOLODIT_API_KEY")
         if not self.api_key:
@@ -141,40 +214,126 @@ class SoloditClient:
             "Content-Type": "application/json",
             "X-Cyfrin-API-Key": self.api_key,
         })
+        # Keep enough pooled connections for concurrent search_many calls
+        self.session.mount("https://", HTTPAdapter(pool_maxsize=MAX_POOL_CONNECTIONS))
+        
+        # In-memory LRU cache: {cache_key: (result, timestamp)}, oldest first
+        self._cache: "OrderedDict[CacheKey, Tuple[Any, float]]" = OrderedDict()
+        # Guards _cache; held only around dict operations, never network calls
+        self._cache_lock = threading.Lock()
+        
+        # Optional on-disk copy of the cache; shelve is not thread-safe
+        self.cache_path = cache_path
+        self._disk_lock = threading.Lock()
+        self._disk_swept = False
         
-        # In-memory cache: {cache_key: (result, timestamp)}
-        self._cache: Dict[str, Tuple[Any, float]] = {}
+        # Requests in flight per cache key, so identical concurrent searches
+        # share one API call; guarded by _cache_lock
+        self._inflight: Dict[CacheKey, Future] = {}
+        
+        # Quota reported by the last response, used to pace the next request
+        self._rate_limit_remaining: Optional[int] = None
+        self._rate_limit_reset = 0.0
         
         logger.info("Solodit client initialized")
     
-    def _get_cache_key(self, endpoint: str, data: Dict) -> str:
+    def _get_cache_key(self, endpoint: str, data: Dict) -> CacheKey:
         """Generate cache key for request"""
-        return f"{endpoint}:{json.dumps(data, sort_keys=True)}"
+        return (endpoint, _freeze(data))
     
-    def _get_cached(self, cache_key: str) -> Optional[Any]:
+    def _get_cached(self, cache_key: CacheKey) -> Optional[Any]:
         """Get cached result if not expired"""
-        if cache_key not in self._cache:
+        with self._cache_lock:
+            entry = self._cache.get(cache_key)
+            if entry is not None:
+                result, timestamp = entry
+                if time.time() - timestamp <= self.cache_ttl:
+                    self._cache.move_to_end(cache_key)
+                    logger.debug(f"Cache hit for {cache_key[0]}")
+                    return result
+                # Expired
+                del self._cache[cache_key]
+        
+        if not self.cache_path:
             return None
         
-        result, timestamp = self._cache[cache_key]
-        if time.time() - timestamp > self.cache_ttl:
-            # Expired
-            del self._cache[cache_key]
+        entry = self._read_disk(self.cache_path, cache_key)
+        if entry is None or time.time() - entry[1] > self.cache_ttl:
             return None
         
-        logger.debug(f"Cache hit for {cache_key[:50]}...")
-        return result
+        self._remember(cache_key, entry)
+        logger.debug(f"Disk cache hit for {cache_key[0]}")
+        return entry[0]
     
-    def _set_cached(self, cache_key: str, result: Any):
+    def _set_cached(self, cache_key: CacheKey, result: Any):
         """Cache result with timestamp"""
-        self._cache[cache_key] = (result, time.time())
-        
-        # Simple cache size management
-        if len(self._cache) > 1000:
-            # Remove oldest entries
-            sorted_items = sorted(self._cache.items(), key=lambda x: x[1][1])
-            for key, _ in sorted_items[:100]:
-                del self._cache[key]
+        entry = (result, time.time())
+        self._remember(cache_key, entry)
+        if self.cache_path:
+            self._write_disk(self.cache_path, cache_key, entry)
+    
+    def _remember(self, cache_key: CacheKey, entry: Tuple[Any, float]):
+        """Store an entry in the in-memory LRU cache"""
+        with self._cache_lock:
+            self._cache[cache_key] = entry
+            self._cache.move_to_end(cache_key)
+            
+            # Evict least recently used entries
+            while len(self._cache) > MAX_CACHE_ENTRIES:
+                self._cache.popitem(last=False)
+    
+    def _disk_key(self, cache_key: CacheKey) -> str:
+        """Shelve keys must be strings; hash the frozen request key"""
+        return hashlib.sha1(repr(cache_key).encode("utf-8")).hexdigest()
+    
+    def _read_disk(self, path: str, cache_key: CacheKey) -> Optional[Tuple[Any, float]]:
+        """Read an entry from the on-disk cache, treating any failure as a miss"""
+        try:
+            with self._disk_lock, shelve.open(path) as cache:
+                return cache.get(self._disk_key(cache_key))
+        except Exception as e:
+            logger.debug(f"Disk cache read failed: {e}")
+            return None
+    
+    def _write_disk(self, path: str, cache_key: CacheKey, entry: Tuple[Any, float]):
+        """Write an entry to the on-disk cache, dropping expired entries on first write"""
+        now = time.time()
+        try:
+            with self._disk_lock, shelve.open(path) as cache:
+                cache[self._disk_key(cache_key)] = entry
+                if self._disk_swept:
+                    return
+                self._disk_swept = True
+                for key in list(cache.keys()):
+                    try:
+                        if now - cache[key][1] > self.cache_ttl:
+                            del cache[key]
+                    except Exception:
+                        del cache[key]
+        except Exception as e:
+            logger.warning(f"Disk cache write failed: {e}")
+    
+    def _backoff(self, attempt: int) -> float:
+        """Exponential backoff with jitter so concurrent workers do not retry in lockstep"""
+        return min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt) * random.uniform(0.5, 1.5)
+    
+    def _reset_wait(self) -> float:
+        """Seconds until the reported rate limit window resets (0 if unknown or past)"""
+        return min(max(self._rate_limit_reset - time.time(), 0.0), MAX_RATE_LIMIT_WAIT)
+    
+    def _update_rate_limit(self, response: requests.Response, body: Any):
+        """Remember the remaining quota from response headers or the JSON body"""
+        rate_limit = body.get("rateLimit") if isinstance(body, dict) else None
+        rate_limit = rate_limit if isinstance(rate_limit, dict) else {}
+        remaining = response.headers.get("X-RateLimit-Remaining", rate_limit.get("remaining"))
+        reset = response.headers.get("X-RateLimit-Reset", rate_limit.get("reset"))
+        try:
+            if remaining is not None:
+                self._rate_limit_remaining = int(remaining)
+            if reset is not None:
+                self._rate_limit_reset = float(reset)
+        except (TypeError, ValueError):
+            pass
     
     def _make_request(
         self,
@@ -202,6 +361,14 @@ class SoloditClient:
         url = f"{SOLODIT_API_BASE}/{endpoint_clean}"
         
         for attempt in range(MAX_RETRIES):
+            # Pace proactively instead of spending a request on a certain 429
+            if self._rate_limit_remaining is not None and self._rate_limit_remaining < 2:
+                wait = self._reset_wait()
+                if wait > 0:
+                    logger.info(f"Rate limit nearly exhausted. Waiting {wait:.1f}s for reset")
+                    time.sleep(wait)
+                self._rate_limit_remaining = None
+            
             try:
                 logger.debug(f"API request to {endpoint} (attempt {attempt + 1})")
                 response = self.session.post(
@@ -212,8 +379,10 @@ class SoloditClient:
                 
                 # Handle rate limiting (429)
                 if response.status_code == 429:
-                    retry_after = int(response.headers.get("Retry-After", 2))
-                    logger.warning(f"Rate limited. Retrying after {retry_after}s")
+                    self._update_rate_limit(response, None)
+                    retry_after = max(float(response.headers.get("Retry-After", 2)), self._reset_wait())
+                    retry_after *= random.uniform(1.0, 1.5)
+                    logger.warning(f"Rate limited. Retrying after {retry_after:.1f}s")
                     if attempt < MAX_RETRIES - 1:
                         time.sleep(retry_after)
                         continue
@@ -227,19 +396,23 @@ class SoloditClient:
                     )
                 
                 response.raise_for_status()
-                return response.json()
+                # json.loads detects UTF-8/16/32 from the raw bytes itself
+                body = json.loads(response.content)
+                self._update_rate_limit(response, body)
+                return body
                 
             except requests.exceptions.Timeout:
                 logger.warning(f"Request timeout (attempt {attempt + 1})")
                 if attempt < MAX_RETRIES - 1:
-                    time.sleep(0.5 * (attempt + 1))
+                    time.sleep(self._backoff(attempt))
                     continue
                 raise SoloditAPIError(f"Request timed out after {timeout}s")
                 
-            except requests.exceptions.RequestException as e:
+            # ValueError covers malformed JSON bodies, as response.json() did
+            except (requests.exceptions.RequestException, ValueError) as e:
                 logger.error(f"Request error: {e}")
                 if attempt < MAX_RETRIES - 1:
-                    time.sleep(0.5 * (attempt + 1))
+                    time.sleep(self._backoff(attempt))
                     continue
                 raise SoloditAPIError(f"Request failed: {e}")
         
@@ -347,13 +520,38 @@ class SoloditClient:
         if filters:
             request_data["filters"] = filters
         
+        if not use_cache:
+            return self._fetch_findings(request_data)
+        
         # Check cache
         cache_key = self._get_cache_key("/findings", request_data)
-        if use_cache:
-            cached = self._get_cached(cache_key)
-            if cached:
-                return cached
+        cached = self._get_cached(cache_key)
+        if cached:
+            return cached
+        
+        # Wait for an identical search already in flight instead of repeating it
+        with self._cache_lock:
+            pending = self._inflight.get(cache_key)
+            if pending is None:
+                future: Future = Future()
+                self._inflight[cache_key] = future
+        if pending is not None:
+            return pending.result()
         
+        try:
+            result = self._fetch_findings(request_data)
+            self._set_cached(cache_key, result)
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._cache_lock:
+                del self._inflight[cache_key]
+    
+    def _fetch_findings(self, request_data: Dict[str, Any]) -> SearchResult:
+        """Issue a /findings request and parse the response"""
         # Make request
         response = self._make_request("/findings", request_data)
         
@@ -398,12 +596,58 @@ class SoloditClient:
             rate_limit_reset=rate_limit.get("reset", 0)
         )
         
-        # Cache result
-        if use_cache:
-            self._set_cached(cache_key, result)
-        
         return result
     
+    def search_many(
+        self,
+        queries: List[Dict[str, Any]],
+        max_workers: int = 8
+    ) -> List[SearchResult]:
+        """
+        Run several independent searches concurrently.
+        
+        Network round-trips overlap, so N searches take roughly as long as the
+        slowest one instead of N sequential requests.
+        
+        Args:
+            queries: Keyword arguments for search_findings, one dict per search
+            max_workers: Maximum number of requests in flight
+            
+        Returns:
+            SearchResult for each query, in the same order as queries
+        """
+        if len(queries) <= 1:
+            return [self.search_findings(**query) for query in queries]
+        
+        workers = max(1, min(max_workers, MAX_POOL_CONNECTIONS, len(queries)))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(self.search_findings, **query) for query in queries]
+            return [future.result() for future in futures]
+    
+    def search_all_findings(self, max_pages: int = 10, **filters) -> List[SoloditFinding]:
+        """
+        Fetch every page of a search, up to max_pages.
+        
+        The first page reports total_pages; the remaining pages are independent
+        and are fetched concurrently through search_many.
+        
+        Args:
+            max_pages: Upper bound on the number of pages fetched
+            **filters: Keyword arguments for search_findings (except page)
+            
+        Returns:
+            Findings from all fetched pages, in page order
+        """
+        filters.pop("page", None)
+        first = self.search_findings(page=1, **filters)
+        last_page = min(first.total_pages, max_pages)
+        rest = self.search_many([dict(filters, page=page) for page in range(2, last_page + 1)])
+        
+        findings = list(first.findings)
+        for result in rest:
+            findings.extend(result.findings)
+        return findings
+    
     def get_finding_by_id(self, finding_id: str) -> Optional[SoloditFinding]:
         """
         Get detailed information about a specific finding by ID or slug.
@@ -445,25 +689,9 @@ class SoloditClient:
         Returns:
             List of similar findings
         """
-        # Map common vulnerability names to Solodit tags
-        tag_mapping = {
-            "reentrancy": ["Reentrancy", "CEI", "External Call"],
-            "access_control": ["Access Control", "Authentication", "Admin"],
-            "oracle": ["Oracle", "Price Manipulation", "TWAP"],
-            "flash_loan": ["Flash Loan", "Price Manipulation"],
-            "rounding": ["Rounding", "Precision", "Decimals"],
-            "overflow": ["Overflow", "Underflow", "SafeMath"],
-            "delegatecall": ["Delegatecall", "Proxy"],
-            "signature": ["Signature", "ECDSA", "EIP-712"],
-            "frontrunning": ["Frontrunning", "MEV", "Sandwich"],
-            "dos": ["DOS", "Gas Limit", "Denial-Of-Service"],
-            "timestamp": ["Timestamp", "block.timestamp"],
-            "randomness": ["Randomness", "Cryptography"],
-        }
-        
         # Get tags for vulnerability type
         lookup_key = vulnerability_type.lower().replace(" ", "_")
-        tags = tag_mapping.get(lookup_key, [vulnerability_type])
+        tags = VULNERABILITY_TAGS.get(lookup_key) or [vulnerability_type]
         
         logger.info(f"Searching for {vulnerability_type} with tags: {tags}")
         
@@ -480,24 +708,48 @@ class SoloditClient:
 
 # Singleton instance for reuse
 _client: Optional[SoloditClient] = None
+_client_lock = threading.Lock()
 
-def get_client(api_key: Optional[str] = None, cache_ttl: int = DEFAULT_CACHE_TTL) -> SoloditClient:
+def get_client(
+    api_key: Optional[str] = None,
+    cache_ttl: Optional[int] = None,
+    cache_path: Optional[str] = None
+) -> SoloditClient:
     """
     Get or create Solodit client singleton.
     
     This is the recommended way to get a client instance in Ralph.
     It reuses the same client across calls for connection pooling and caching.
+    Settings only take effect when the client is created; asking an existing
+    client for a different cache_ttl or cache_path logs a warning.
     
     Args:
         api_key: Optional API key (uses env var if not provided)
-        cache_ttl: Cache time-to-live in seconds
+        cache_ttl: Cache time-to-live in seconds (default: DEFAULT_CACHE_TTL)
+        cache_path: Optional shelve file for persisting cached responses
         
     Returns:
         SoloditClient instance
     """
     global _client
     if _client is None:
-        _client = SoloditClient(api_key=api_key, cache_ttl=cache_ttl)
+        with _client_lock:
+            if _client is None:
+                _client = SoloditClient(
+                    api_key=api_key,
+                    cache_ttl=DEFAULT_CACHE_TTL if cache_ttl is None else cache_ttl,
+                    cache_path=cache_path
+                )
+                return _client
+    
+    if cache_ttl is not None and cache_ttl != _client.cache_ttl:
+        logger.warning(
+            f"Solodit client already created with cache_ttl={_client.cache_ttl}; ignoring {cache_ttl}"
+        )
+    if cache_path is not None and cache_path != _client.cache_path:
+        logger.warning(
+            f"Solodit client already created with cache_path={_client.cache_path}; ignoring {cache_path}"
+        )
     return _client
 
 
@@ -552,11 +804,26 @@ if __name__ == "__main__":
         default="text",
         help="Output format"
     )
+    parser.add_argument(
+        "--cache",
+        metavar="FILE",
+        default=DEFAULT_CACHE_PATH,
+        help=f"Shelve file for caching responses across runs (default: {DEFAULT_CACHE_PATH})"
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Do not read or write the on-disk cache"
+    )
     
     args = parser.parse_args()
     
     try:
-        client = get_client()
+        cache_path = None
+        if not args.no_cache:
+            cache_path = args.cache
+            os.makedirs(os.path.dirname(cache_path) or ".", exist_ok=True)
+        client = get_client(cache_path=cache_path)
         
         results = client.search_findings(
             keywords=args.keywords,
@@ -568,23 +835,28 @@ if __name__ == "__main__":
         )
         
         if args.output == "json":
-            import json
             output = {
                 "total": results.total_results,
                 "findings": [f.to_dict() for f in results.findings]
             }
             print(json.dumps(output, indent=2))
         else:
-            print(f"Found {results.total_results} results (showing {len(results.findings)}):")
-            print(f"Rate limit: {results.rate_limit_remaining} remaining\n")
-            
+            # Build the whole listing and write it once
+            lines = [
+                f"Found {results.total_results} results (showing {len(results.findings)}):",
+                f"Rate limit: {results.rate_limit_remaining} remaining",
+                "",
+            ]
             for i, finding in enumerate(results.findings, 1):
-                print(f"{i}. [{finding.impact}] {finding.title}")
-                print(f"   Protocol: {finding.protocol_name or 'N/A'}")
-                print(f"   Firm: {finding.firm_name or 'N/A'}")
-                print(f"   Quality: {finding.quality_score}/5 | Rarity: {finding.rarity_score}/5")
-                print(f"   Tags: {', '.join(finding.tags[:5])}")
-                print()
+                lines.extend((
+                    f"{i}. [{finding.impact}] {finding.title}",
+                    f"   Protocol: {finding.protocol_name or 'N/A'}",
+                    f"   Firm: {finding.firm_name or 'N/A'}",
+                    f"   Quality: {finding.quality_score}/5 | Rarity: {finding.rarity_score}/5",
+                    f"   Tags: {', '.join(finding.tags[:5])}",
+                    "",
+                ))
+            sys.stdout.write("\n".join(lines) + "\n")
                 
     except SoloditAPIError as e:
         print(f"Error: {e}", file=sys.stderr)
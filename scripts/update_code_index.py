@@ -5,22 +5,43 @@ Creates a searchable index of all functions, contracts, and capabilities
 """
 
 import argparse
+import hashlib
+import json
 import os
 import ast
 import re
+import sys
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+from operator import attrgetter
 from pathlib import Path
-from typing import List, Dict, Optional, Any
-from dataclasses import dataclass
+from typing import List, Dict, NamedTuple, Optional, Tuple
 
 DEFAULT_INDEX_FILE = "CODE_INDEX.md"
 IGNORE_PATTERNS = {
     ".git", "node_modules", "venv", ".venv", "__pycache__",
     "findings", "codeql-db", ".agent"
 }
+SOURCE_EXTENSIONS = ('.py', '.sol', '.js', '.ts', '.jsx', '.tsx')
 
+# Persistent per-file entries, keyed by path and content hash. They live in
+# .agent/, which the installer already adds to projects. The schema ties them
+# to this script and the interpreter; any change discards the store.
+CACHE_DIR = ".agent"
+CACHE_FILE = os.path.join(CACHE_DIR, "code_index_cache.json")
+CACHE_SCHEMA = "|".join((
+    hashlib.sha256(Path(__file__).read_bytes()).hexdigest(),
+    ".".join(map(str, sys.version_info[:2])),
+))
 
-@dataclass
-class CodeEntry:
+# Below this many files to analyze, scan_directory stays in-process
+PARALLEL_MIN_FILES = 50
+
+# generate_index shows at most this many characters of a signature
+SIGNATURE_WIDTH = 40
+
+
+class CodeEntry(NamedTuple):
     """Represents a code entry for indexing"""
     name: str
     file_path: str
@@ -35,17 +56,35 @@ class CodeEntry:
 class PythonAnalyzer:
     """Analyze Python files"""
     
+    # Only these nodes can contain statements, so definitions are never found
+    # below anything else (match_case exists from Python 3.10)
+    STATEMENT_PARENTS = tuple(
+        getattr(ast, name) for name in ('stmt', 'excepthandler', 'match_case')
+        if hasattr(ast, name)
+    )
+    
+    @staticmethod
+    def iter_statements(tree: ast.AST):
+        """Yield nodes in ast.walk order, visiting statements but no expressions"""
+        parents = PythonAnalyzer.STATEMENT_PARENTS
+        todo = deque([tree])
+        while todo:
+            node = todo.popleft()
+            for field in node._fields:
+                value = getattr(node, field, None)
+                if isinstance(value, list):
+                    todo.extend(child for child in value if isinstance(child, parents))
+            yield node
+    
     @staticmethod
-    def analyze(filepath: str) -> List[CodeEntry]:
+    def analyze(filepath: str, content: str) -> List[CodeEntry]:
         entries = []
         try:
-            with open(filepath, 'r', encoding='utf-8') as f:
-                content = f.read()
-                tree = ast.parse(content)
+            tree = ast.parse(content)
         except Exception:
             return entries
         
-        for node in ast.walk(tree):
+        for node in PythonAnalyzer.iter_statements(tree):
             if isinstance(node, ast.FunctionDef):
                 doc = ast.get_docstring(node) or "No description"
                 desc = doc.split('\n')[0][:60]
@@ -76,10 +115,28 @@ class PythonAnalyzer:
         return entries
 
 
+class LineCounter:
+    """Line numbers for increasing offsets (as finditer yields), counting each newline once"""
+    
+    def __init__(self, content: str):
+        self.content = content
+        self.offset = 0
+        self.line = 1
+    
+    def __call__(self, offset: int) -> int:
+        if offset < self.offset:
+            # A new pass over the content; start counting again
+            self.offset, self.line = 0, 1
+        self.line += self.content.count('\n', self.offset, offset)
+        self.offset = offset
+        return self.line
+
+
 class SolidityAnalyzer:
     """Analyze Solidity files"""
     
-    # Regex patterns for Solidity parsing
+    # Regex patterns for Solidity parsing. Each starts with a literal keyword,
+    # so analyze skips the scan when the keyword is absent from the file.
     PATTERNS = {
         'contract': re.compile(
             r'contract\s+(\w+)\s*(?:is\s+([\w,\s]+))?\s*\{',
@@ -104,78 +161,77 @@ class SolidityAnalyzer:
     }
     
     @staticmethod
-    def analyze(filepath: str) -> List[CodeEntry]:
+    def analyze(filepath: str, content: str) -> List[CodeEntry]:
         entries = []
-        try:
-            with open(filepath, 'r', encoding='utf-8') as f:
-                content = f.read()
-                lines = content.split('\n')
-        except Exception:
-            return entries
+        line_at = LineCounter(content)
         
         # Find contracts
-        for match in SolidityAnalyzer.PATTERNS['contract'].finditer(content):
-            name = match.group(1)
-            line_num = content[:match.start()].count('\n') + 1
-            inheritance = match.group(2) or ""
-            
-            entries.append(CodeEntry(
-                name=name,
-                file_path=filepath,
-                line_number=line_num,
-                entry_type="contract",
-                description=f"Inherits: {inheritance}" if inheritance else "Contract",
-                params=""
-            ))
+        if 'contract' in content:
+            for match in SolidityAnalyzer.PATTERNS['contract'].finditer(content):
+                name = match.group(1)
+                line_num = line_at(match.start())
+                inheritance = match.group(2) or ""
+                
+                entries.append(CodeEntry(
+                    name=name,
+                    file_path=filepath,
+                    line_number=line_num,
+                    entry_type="contract",
+                    description=f"Inherits: {inheritance}" if inheritance else "Contract",
+                    params=""
+                ))
         
         # Find functions
-        for match in SolidityAnalyzer.PATTERNS['function'].finditer(content):
-            name = match.group(1)
-            params = match.group(2)
-            visibility = match.group(3) or ""
-            modifiers = match.group(4) or ""
-            line_num = content[:match.start()].count('\n') + 1
-            
-            entries.append(CodeEntry(
-                name=name,
-                file_path=filepath,
-                line_number=line_num,
-                entry_type="function",
-                description=f"{visibility} function",
-                params=f"({params})",
-                visibility=visibility,
-                modifiers=modifiers.strip()
-            ))
+        if 'function' in content:
+            for match in SolidityAnalyzer.PATTERNS['function'].finditer(content):
+                name = match.group(1)
+                params = match.group(2)
+                visibility = match.group(3) or ""
+                modifiers = match.group(4) or ""
+                line_num = line_at(match.start())
+                
+                entries.append(CodeEntry(
+                    name=name,
+                    file_path=filepath,
+                    line_number=line_num,
+                    entry_type="function",
+                    description=f"{visibility} function",
+                    params=f"({params})",
+                    visibility=visibility,
+                    modifiers=modifiers.strip()
+                ))
         
         # Find modifiers
-        for match in SolidityAnalyzer.PATTERNS['modifier'].finditer(content):
-            name = match.group(1)
-            params = match.group(2) or ""
-            line_num = content[:match.start()].count('\n') + 1
-            
-            entries.append(CodeEntry(
-                name=name,
-                file_path=filepath,
-                line_number=line_num,
-                entry_type="modifier",
-                description="Access control modifier",
-                params=f"({params})"
-            ))
+        if 'modifier' in content:
+            for match in SolidityAnalyzer.PATTERNS['modifier'].finditer(content):
+                name = match.group(1)
+                params = match.group(2) or ""
+                line_num = line_at(match.start())
+                
+                entries.append(CodeEntry(
+                    name=name,
+                    file_path=filepath,
+                    line_number=line_num,
+                    entry_type="modifier",
+                    description="Access control modifier",
+                    params=f"({params})"
+                ))
         
         # Find events
-        for match in SolidityAnalyzer.PATTERNS['event'].finditer(content):
-            name = match.group(1)
-            params = match.group(2)
-            line_num = content[:match.start()].count('\n') + 1
-            
-            entries.append(CodeEntry(
-                name=name,
-                file_path=filepath,
-                line_number=line_num,
-                entry_type="event",
-                description="Event",
-                params=f"({params})"
-            ))
+        if 'event' in content:
+            for match in SolidityAnalyzer.PATTERNS['event'].finditer(content):
+                name = match.group(1)
+                params = match.group(2)
+                line_num = line_at(match.start())
+                
+                entries.append(CodeEntry(
+                    name=name,
+                    file_path=filepath,
+                    line_number=line_num,
+                    entry_type="event",
+                    description="Event",
+                    params=f"({params})"
+                ))
         
         return entries
 
@@ -203,96 +259,197 @@ class JavaScriptAnalyzer:
     }
     
     @staticmethod
-    def analyze(filepath: str) -> List[CodeEntry]:
+    def analyze(filepath: str, content: str) -> List[CodeEntry]:
         entries = []
-        try:
-            with open(filepath, 'r', encoding='utf-8') as f:
-                content = f.read()
-        except Exception:
-            return entries
+        line_at = LineCounter(content)
         
         # Find functions
-        for match in JavaScriptAnalyzer.PATTERNS['function'].finditer(content):
-            name = match.group(1)
-            params = match.group(2)
-            line_num = content[:match.start()].count('\n') + 1
-            
-            entries.append(CodeEntry(
-                name=name,
-                file_path=filepath,
-                line_number=line_num,
-                entry_type="function",
-                description="Function",
-                params=f"({params})"
-            ))
+        if 'function' in content:
+            for match in JavaScriptAnalyzer.PATTERNS['function'].finditer(content):
+                name = match.group(1)
+                params = match.group(2)
+                line_num = line_at(match.start())
+                
+                entries.append(CodeEntry(
+                    name=name,
+                    file_path=filepath,
+                    line_number=line_num,
+                    entry_type="function",
+                    description="Function",
+                    params=f"({params})"
+                ))
         
         # Find classes
-        for match in JavaScriptAnalyzer.PATTERNS['class'].finditer(content):
-            name = match.group(1)
-            extends = match.group(2)
-            line_num = content[:match.start()].count('\n') + 1
-            
-            entries.append(CodeEntry(
-                name=name,
-                file_path=filepath,
-                line_number=line_num,
-                entry_type="class",
-                description=f"Class extends {extends}" if extends else "Class",
-                params=""
-            ))
+        if 'class' in content:
+            for match in JavaScriptAnalyzer.PATTERNS['class'].finditer(content):
+                name = match.group(1)
+                extends = match.group(2)
+                line_num = line_at(match.start())
+                
+                entries.append(CodeEntry(
+                    name=name,
+                    file_path=filepath,
+                    line_number=line_num,
+                    entry_type="class",
+                    description=f"Class extends {extends}" if extends else "Class",
+                    params=""
+                ))
         
         return entries
 
 
-def should_process_file(filepath: str, root_dir: str) -> bool:
-    """Determine if file should be indexed"""
-    # Skip hidden files
-    if '/.' in filepath:
-        return False
-    
-    # Skip ignored directories (by path component)
-    rel_path = os.path.relpath(filepath, root_dir)
-    for part in Path(rel_path).parts:
-        if part in IGNORE_PATTERNS:
-            return False
-    
-    # Check extension
-    valid_extensions = {'.py', '.sol', '.js', '.ts', '.jsx', '.tsx'}
-    return any(filepath.endswith(ext) for ext in valid_extensions)
+# Analyzer per file extension; keys match SOURCE_EXTENSIONS
+ANALYZERS = {
+    '.py': PythonAnalyzer.analyze,
+    '.sol': SolidityAnalyzer.analyze,
+    '.js': JavaScriptAnalyzer.analyze,
+    '.ts': JavaScriptAnalyzer.analyze,
+    '.jsx': JavaScriptAnalyzer.analyze,
+    '.tsx': JavaScriptAnalyzer.analyze,
+}
+
+
+def _collect_source_files(directory: str, paths: List[str]) -> None:
+    """Append indexable files under directory to paths, in os.walk order"""
+    # Hidden and ignored directories are pruned without being entered, and
+    # paths are built from DirEntry instead of relpath/Path per file. Files of
+    # a directory are listed before its subdirectories.
+    subdirs: List[str] = []
+    try:
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                name = entry.name
+                if name.startswith('.'):
+                    continue
+                try:
+                    is_dir = entry.is_dir()
+                except OSError:
+                    is_dir = False
+                if is_dir:
+                    if name not in IGNORE_PATTERNS and not entry.is_symlink():
+                        subdirs.append(entry.path)
+                elif name.endswith(SOURCE_EXTENSIONS):
+                    paths.append(entry.path)
+    except OSError:
+        return
+    for subdir in subdirs:
+        _collect_source_files(subdir, paths)
 
 
-def analyze_file(filepath: str) -> List[CodeEntry]:
+def read_source(filepath: str) -> Optional[str]:
+    """Read a file as UTF-8 text, or None if it cannot be read"""
+    # One raw read skips the buffered text layer; newlines are normalized
+    # as text mode would, and undecodable files are still skipped.
+    try:
+        fd = os.open(filepath, os.O_RDONLY)
+        try:
+            data = os.read(fd, os.fstat(fd).st_size)
+        finally:
+            os.close(fd)
+        content = data.decode('utf-8')
+    except (OSError, UnicodeDecodeError):
+        return None
+    if '\r' in content:
+        content = content.replace('\r\n', '\n').replace('\r', '\n')
+    return content
+
+
+def analyze_file(filepath: str, content: Optional[str] = None) -> List[CodeEntry]:
     """Route file to appropriate analyzer"""
-    if filepath.endswith('.py'):
-        return PythonAnalyzer.analyze(filepath)
-    elif filepath.endswith('.sol'):
-        return SolidityAnalyzer.analyze(filepath)
-    elif filepath.endswith(('.js', '.ts', '.jsx', '.tsx')):
-        return JavaScriptAnalyzer.analyze(filepath)
-    return []
+    analyze = ANALYZERS.get(os.path.splitext(filepath)[1])
+    if analyze is None:
+        return []
+    if content is None:
+        content = read_source(filepath)
+        if content is None:
+            return []
+    return analyze(filepath, content)
+
+
+def load_entries_cache() -> Dict[str, List[list]]:
+    """Load stored entries, discarding them if the schema has changed"""
+    try:
+        with open(CACHE_FILE, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if not isinstance(data, dict) or data.get("schema") != CACHE_SCHEMA:
+        return {}
+    entries = data.get("entries")
+    return entries if isinstance(entries, dict) else {}
 
 
-def scan_directory(root_dir: str = '.') -> List[CodeEntry]:
+def save_entries_cache(entries: Dict[str, List[list]]):
+    """Persist entries for the files seen in this run"""
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        tmp_path = f"{CACHE_FILE}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({"schema": CACHE_SCHEMA, "entries": entries}, f)
+        os.replace(tmp_path, CACHE_FILE)
+    except OSError:
+        pass  # Caching is best effort
+
+
+def entry_key(filepath: str, content: str) -> str:
+    """Cache key for a file's entries; entries carry the path, so it is hashed too"""
+    return hashlib.sha256(f"{filepath}\0{content}".encode('utf-8', 'surrogatepass')).hexdigest()
+
+
+def scan_directory(root_dir: str = '.', use_cache: bool = True) -> Tuple[List[CodeEntry], int]:
     """Scan directory and analyze all files"""
     all_entries = []
     file_count = 0
     
-    for root, dirs, files in os.walk(root_dir):
-        # Filter out ignored directories
-        dirs[:] = [d for d in dirs if d not in IGNORE_PATTERNS]
-        
-        for filename in files:
-            filepath = os.path.join(root, filename)
-            
-            if should_process_file(filepath, root_dir):
-                entries = analyze_file(filepath)
-                if entries:
-                    all_entries.extend(entries)
-                    file_count += 1
+    paths: List[str] = []
+    _collect_source_files(root_dir, paths)
+    
+    # Unchanged files reuse stored entries; only the rest are analyzed
+    cache = load_entries_cache() if use_cache else {}
+    seen: Dict[str, List[list]] = {}
+    results: List[List[CodeEntry]] = [[] for _ in paths]
+    misses = []
+    for i, filepath in enumerate(paths):
+        content = read_source(filepath)
+        if content is None:
+            continue
+        key = entry_key(filepath, content) if use_cache else ""
+        rows = cache.get(key)
+        if rows is not None:
+            results[i] = [CodeEntry(*row) for row in rows]
+            seen[key] = rows
+        else:
+            misses.append((i, filepath, content, key))
+    
+    # Files are independent and CPU-bound; small batches aren't worth the pool startup
+    miss_paths = [filepath for _, filepath, _, _ in misses]
+    miss_contents = [content for _, _, content, _ in misses]
+    if len(misses) < PARALLEL_MIN_FILES or (os.cpu_count() or 1) < 2:
+        fresh = [analyze_file(filepath, content) for filepath, content in zip(miss_paths, miss_contents)]
+    else:
+        with ProcessPoolExecutor() as executor:
+            fresh = list(executor.map(analyze_file, miss_paths, miss_contents, chunksize=32))
+    for (i, _, _, key), entries in zip(misses, fresh):
+        results[i] = entries
+        if use_cache:
+            seen[key] = [list(e) for e in entries]
+    
+    if use_cache:
+        save_entries_cache(seen)
+    
+    for entries in results:
+        if entries:
+            all_entries.extend(entries)
+            file_count += 1
     
     return all_entries, file_count
 
 
+def count_types(entries: List[CodeEntry]) -> List[Tuple[str, int]]:
+    """Entry counts per type, most common first (ties in first-seen order)"""
+    return Counter(map(attrgetter('entry_type'), entries)).most_common()
+
+
 def generate_index(entries: List[CodeEntry]) -> str:
     """Generate markdown index from entries"""
     lines = [
@@ -306,14 +463,14 @@ def generate_index(entries: List[CodeEntry]) -> str:
     ]
     
     # Sort entries by type then name
-    sorted_entries = sorted(entries, key=lambda e: (e.entry_type, e.name))
+    sorted_entries = sorted(entries, key=attrgetter('entry_type', 'name'))
     
     for entry in sorted_entries:
         # Clean up description
         desc = entry.description.replace('|', '\\|')[:50]
         
         # Clean up params
-        params = entry.params.replace('|', '\\|')[:40]
+        params = entry.params.replace('|', '\\|')[:SIGNATURE_WIDTH]
         
         # Get relative path
         rel_path = entry.file_path.lstrip('./')
@@ -324,17 +481,13 @@ def generate_index(entries: List[CodeEntry]) -> str:
         )
     
     # Add statistics by type
-    type_counts: Dict[str, int] = {}
-    for entry in entries:
-        type_counts[entry.entry_type] = type_counts.get(entry.entry_type, 0) + 1
-    
     lines.extend([
         "\n## Statistics\n",
         "| Type | Count |",
         "|------|-------|"
     ])
     
-    for entry_type, count in sorted(type_counts.items(), key=lambda x: -x[1]):
+    for entry_type, count in count_types(entries):
         lines.append(f"| {entry_type} | {count} |")
     
     return '\n'.join(lines)
@@ -345,12 +498,13 @@ def main():
     parser = argparse.ArgumentParser(description="Generate a semantic code index")
     parser.add_argument("--root", default=".", help="Root directory to scan")
     parser.add_argument("--output", default=DEFAULT_INDEX_FILE, help="Output markdown file")
+    parser.add_argument("--no-cache", action="store_true", help=f"Ignore and do not update {CACHE_FILE}")
     args = parser.parse_args()
 
     print("🧠 Semantic Indexing...")
     print("   Analyzing Python, Solidity, and JavaScript/TypeScript files")
     
-    entries, file_count = scan_directory(args.root)
+    entries, file_count = scan_directory(args.root, use_cache=not args.no_cache)
     
     if not entries:
         print("⚠️  No code entries found")
@@ -360,19 +514,14 @@ def main():
     
     output_path = Path(args.output)
     output_path.parent.mkdir(parents=True, exist_ok=True)
-    with open(output_path, 'w', encoding='utf-8') as f:
-        f.write(index_content)
+    output_path.write_bytes(index_content.encode('utf-8'))
     
     print(f"✅ Updated {output_path}")
     print(f"   Files analyzed: {file_count}")
     print(f"   Total entries: {len(entries)}")
     
     # Show breakdown
-    type_counts: Dict[str, int] = {}
-    for entry in entries:
-        type_counts[entry.entry_type] = type_counts.get(entry.entry_type, 0) + 1
-    
-    for entry_type, count in sorted(type_counts.items(), key=lambda x: -x[1]):
+    for entry_type, count in count_types(entries):
         print(f"   - {entry_type}: {count}")
 
 